@@ -0,0 +1,272 @@
+# Local stand-in for the parts of the Reddit API that fetch_reddit.py uses:
+#
+#   POST /api/v1/access_token         -> a bearer token
+#   GET  /r/<sub>/top?limit=N         -> a listing of N posts
+#   GET  /r/<sub>/comments/<id>       -> [post listing, comment tree]
+#
+# Payloads are synthetic (deterministic per subreddit/post id) unless
+# --fixtures points at recorded responses laid out as
+# <dir>/top/<sub>.json and <dir>/comments/<post id>.json.
+# Latency, X-Ratelimit-* headers and injected 429/5xx errors are configurable.
+#
+#   python bench/fake_reddit.py --port 8080 --latency 0.05 --error-rate 0.01
+#
+# Point the fetcher at it with REDDIT_API_BASE=http://127.0.0.1:8080 and
+# REDDIT_AUTH_URL=http://127.0.0.1:8080/api/v1/access_token.
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import functools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+def _rng(*parts):
+    return random.Random('/'.join(str(p) for p in parts))
+
+def synthetic_listing(subreddit, limit):
+    children = []
+    for i in range(limit):
+        rng = _rng(subreddit, i)
+        post_id = f'{subreddit}{i}'
+        data = {
+            'id': post_id,
+            'subreddit': subreddit,
+            'title': f'Synthetic post {i} in r/{subreddit}',
+            'author': f'user{rng.randrange(10000)}',
+            'permalink': f'/r/{subreddit}/comments/{post_id}/synthetic_post_{i}/',
+            'selftext': 'lorem ipsum ' * rng.randrange(0, 120),
+            'ups': rng.randrange(10, 50000),
+            'num_comments': rng.randrange(0, 2000),
+            'created_utc': 1700000000 + rng.randrange(86400),
+            'over_18': False,
+            'stickied': False,
+            'is_video': False,
+            'url': f'https://www.reddit.com/r/{subreddit}/comments/{post_id}/',
+        }
+        kind = rng.random()
+        if kind < 0.3:
+            data['post_hint'] = 'image'
+            data['url'] = f'https://i.redd.it/{post_id}.jpg'
+            data['preview'] = {'images': [{
+                'source': {'url': f'https://preview.redd.it/{post_id}.jpg?width=3000', 'width': 3000, 'height': 2000},
+                'resolutions': [
+                    {'url': f'https://preview.redd.it/{post_id}.jpg?width={w}', 'width': w, 'height': w * 2 // 3}
+                    for w in (108, 216, 320, 640, 960, 1080)
+                ],
+            }]}
+        elif kind < 0.4:
+            data['is_video'] = True
+            data['media'] = {'reddit_video': {
+                'dash_url': f'https://v.redd.it/{post_id}/DASHPlaylist.mpd?a=1&b=2',
+                'hls_url': f'https://v.redd.it/{post_id}/HLSPlaylist.m3u8?a=1&b=2',
+                'fallback_url': f'https://v.redd.it/{post_id}/DASH_720.mp4',
+            }}
+        children.append({'kind': 't3', 'data': data})
+    return {'kind': 'Listing', 'data': {'after': None, 'dist': limit, 'modhash': '',
+                                        'children': children, 'before': None}}
+
+def _comment(post_id, path, depth, max_depth, width):
+    rng = _rng(post_id, *path)
+    data = {
+        'id': f'c{"_".join(map(str, path))}',
+        'author': f'user{rng.randrange(10000)}',
+        'body': 'comment text ' * rng.randrange(1, 60),
+        'ups': rng.randrange(0, 5000),
+        'created_utc': 1700000000 + rng.randrange(86400),
+        'replies': '',
+    }
+    if depth < max_depth:
+        data['replies'] = {'kind': 'Listing', 'data': {'children': [
+            _comment(post_id, path + (i,), depth + 1, max_depth, width) for i in range(width)
+        ]}}
+    return {'kind': 't1', 'data': data}
+
+# `depth` is honoured like Reddit does; `limit` is deliberately ignored so
+# the stand-in always serves the full `thread_size` tree (the worst case)
+def synthetic_comments(post_id, thread_size, depth, reply_width):
+    top = [_comment(post_id, (i,), 1, depth, reply_width) for i in range(thread_size)]
+    top.append({'kind': 'more', 'data': {'count': 100, 'children': []}})
+    post = {'kind': 'Listing', 'data': {'children': [{'kind': 't3', 'data': {'id': post_id}}]}}
+    return [post, {'kind': 'Listing', 'data': {'after': None, 'dist': None, 'modhash': '',
+                                               'children': top, 'before': None}}]
+
+# Serialized comment tree shared by every thread of the same shape, so the
+# server's own JSON work doesn't dominate large benchmarks
+@functools.lru_cache(maxsize=16)
+def _shared_tree(thread_size, depth, reply_width):
+    tree = synthetic_comments('shared', thread_size, depth, reply_width)[1]
+    return json.dumps(tree)
+
+def synthetic_comments_body(post_id, thread_size, depth, reply_width):
+    post = json.dumps({'kind': 'Listing', 'data': {'children': [{'kind': 't3', 'data': {'id': post_id}}]}})
+    return f'[{post}, {_shared_tree(thread_size, depth, reply_width)}]'.encode('utf-8')
+
+class FakeReddit:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 ratelimit=1000, window=600, thread_size=50, reply_width=5, fixtures=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.ratelimit = ratelimit
+        self.window = window
+        self.thread_size = thread_size
+        self.reply_width = reply_width
+        self.fixtures = fixtures
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._window_index = 0
+        self.window_used = 0
+        self.stats = {'requests': 0, 'tokens': 0, 'listings': 0, 'comments': 0,
+                      'errors': 0, 'throttled': 0, 'bytes_sent': 0}
+
+    def count(self, field, amount=1):
+        with self._lock:
+            self.stats[field] += amount
+
+    # X-Ratelimit-* headers for a request made now; None when the window is spent
+    def take_ratelimit(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            window_index, into_window = divmod(elapsed, self.window)
+            if window_index != self._window_index:
+                self._window_index = window_index
+                self.window_used = 0
+            reset = int(self.window - into_window) + 1
+            if self.window_used >= self.ratelimit:
+                return None, reset
+            self.window_used += 1
+            return {
+                'X-Ratelimit-Used': str(self.window_used),
+                'X-Ratelimit-Remaining': str(self.ratelimit - self.window_used),
+                'X-Ratelimit-Reset': str(reset),
+            }, reset
+
+    def roll(self):
+        with self._lock:
+            return self._rng.random(), max(0.0, self._rng.gauss(self.latency, self.jitter))
+
+    def fixture(self, *parts):
+        if not self.fixtures:
+            return None
+        path = os.path.join(self.fixtures, *parts)
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except OSError:
+            return None
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; without this, Nagle's
+        # algorithm plus delayed ACKs add ~40ms to every keep-alive response
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, payload, headers=None):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=UTF-8')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+            fake.count('bytes_sent', len(body))
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            fake.count('requests')
+            fake.count('tokens')
+            self.send_json(200, {'access_token': 'fake-token', 'token_type': 'bearer',
+                                 'expires_in': 3600, 'scope': '*'})
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/__stats':
+                return self.send_json(200, fake.stats)
+            fake.count('requests')
+            roll, delay = fake.roll()
+            time.sleep(delay)
+
+            headers, reset = fake.take_ratelimit()
+            if headers is None or roll < fake.throttle_rate:
+                fake.count('throttled')
+                return self.send_json(429, {'message': 'Too Many Requests', 'error': 429},
+                                      {'Retry-After': str(reset if headers is None else 1)})
+            if roll < fake.throttle_rate + fake.error_rate:
+                fake.count('errors')
+                return self.send_json(503, {'message': 'Service Unavailable', 'error': 503}, headers)
+
+            query = parse_qs(url.query)
+            parts = url.path.strip('/').split('/')
+            if len(parts) == 3 and parts[0] == 'r' and parts[2] == 'top':
+                fake.count('listings')
+                limit = int(query.get('limit', ['25'])[0])
+                payload = fake.fixture('top', f'{parts[1]}.json') or synthetic_listing(parts[1], limit)
+                return self.send_json(200, payload, headers)
+            if len(parts) >= 4 and parts[0] == 'r' and parts[2] == 'comments':
+                fake.count('comments')
+                depth = int(query.get('depth', ['10'])[0])
+                payload = (fake.fixture('comments', f'{parts[3]}.json')
+                           or synthetic_comments_body(parts[3], fake.thread_size, depth, fake.reply_width))
+                return self.send_json(200, payload, headers)
+            self.send_json(404, {'message': 'Not Found', 'error': 404}, headers)
+
+    return Handler
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # Clients that stop reading a streamed body hang up mid-response; that's expected
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def serve(fake, host='127.0.0.1', port=0):
+    server = _Server((host, port), make_handler(fake))
+    return server
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve fake Reddit API responses for benchmarks.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help="0 picks a free port")
+    parser.add_argument('--latency', type=float, default=0.0, help="mean response delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="standard deviation of the delay")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of GETs answered with 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of GETs answered with 429")
+    parser.add_argument('--ratelimit', type=int, default=1000, help="requests allowed per window")
+    parser.add_argument('--window', type=int, default=600, help="rate-limit window in seconds")
+    parser.add_argument('--thread-size', type=int, default=50, help="top-level comments per thread")
+    parser.add_argument('--reply-width', type=int, default=5, help="replies per comment")
+    parser.add_argument('--fixtures', help="directory of recorded top/ and comments/ payloads")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    fake = FakeReddit(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      throttle_rate=args.throttle_rate, ratelimit=args.ratelimit, window=args.window,
+                      thread_size=args.thread_size, reply_width=args.reply_width,
+                      fixtures=args.fixtures, seed=args.seed)
+    server = serve(fake, args.host, args.port)
+    # The harness reads the bound address from this first line
+    print(f"http://{server.server_address[0]}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
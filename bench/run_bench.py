@@ -0,0 +1,193 @@
+# Offline throughput benchmark for src/fetch_reddit.py.
+#
+# Starts bench/fake_reddit.py as a subprocess, then for every scale (number
+# of subreddits) runs three measurements, each in a fresh worker process so
+# peak RSS is per measurement:
+#
+#   main      a full cold build (no HTTP cache, no incremental state)
+#   comments  get_top_comments() against the fake server's large threads
+#   render    generate_html() for the same number of posts, no network
+#
+#   python bench/run_bench.py                      # 10/100/1000 subreddits
+#   python bench/run_bench.py --scales 10 100 --latency 0.05 --json out.json
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def server_stats(url):
+    with urllib.request.urlopen(f'{url}/__stats') as res:
+        return json.load(res)
+
+# ---- worker side: runs inside a fresh interpreter -------------------------
+
+def _import_fetcher(url):
+    os.environ['REDDIT_API_BASE'] = url
+    os.environ['REDDIT_AUTH_URL'] = f'{url}/api/v1/access_token'
+    sys.path.insert(0, SRC_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    import fetch_reddit
+    return fetch_reddit
+
+def worker_main(args):
+    fetch_reddit = _import_fetcher(args.url)
+    fetch_reddit.SUBREDDITS = {f'bench{i}': args.posts for i in range(args.subreddits)}
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        before = server_stats(args.url)
+        start = time.perf_counter()
+        fetch_reddit.main(['--no-cache', '--full', '--cache-dir', os.path.join(work, 'cache')]
+                          + args.main_args)
+        wall = time.perf_counter() - start
+        after = server_stats(args.url)
+    requests_made = after['requests'] - before['requests']
+    return {
+        'wall_s': wall,
+        'requests': requests_made,
+        'requests_per_s': requests_made / wall if wall else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def worker_comments(args):
+    fetch_reddit = _import_fetcher(args.url)
+    results = {}
+    with tempfile.TemporaryDirectory() as work:
+        fetch_args = fetch_reddit.parse_args(['--no-cache', '--cache-dir', work])
+        client = fetch_reddit.make_client(fetch_args)
+        for label, stream in (('stream', True), ('full', False)):
+            start = time.perf_counter()
+            for i in range(args.posts):
+                fetch_reddit.get_top_comments(client, 'bench0', f'bench0{i}', stream=stream)
+            results[f'{label}_ms_per_post'] = (time.perf_counter() - start) * 1000 / args.posts
+        results['bytes_decoded'] = client.stats.bytes_decoded
+        client.close()
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+def worker_render(args):
+    fetch_reddit = _import_fetcher(args.url)
+    from fake_reddit import synthetic_comments, synthetic_listing
+    from models import parse_comments, parse_post
+    posts = []
+    for i in range(args.subreddits):
+        subreddit = f'bench{i}'
+        for child in synthetic_listing(subreddit, args.posts)['data']['children']:
+            tree = synthetic_comments(child['data']['id'], 5, 2, 5)
+            comments = parse_comments(tree[1]['data']['children'])
+            posts.append(parse_post(subreddit, child['data'], comments))
+    with tempfile.TemporaryDirectory() as work:
+        start = time.perf_counter()
+        html = fetch_reddit.generate_html(posts, cache_dir=work)
+        render = time.perf_counter() - start
+        path = os.path.join(work, 'index.html')
+        start = time.perf_counter()
+        fetch_reddit.write_html(posts, path, cache_dir=work)
+        stream = time.perf_counter() - start
+    return {
+        'posts': len(posts),
+        'render_s': render,
+        'stream_render_s': stream,
+        'html_bytes': len(html.encode('utf-8')),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+WORKERS = {'main': worker_main, 'comments': worker_comments, 'render': worker_render}
+
+# ---- harness side ----------------------------------------------------------
+
+def start_server(args):
+    cmd = [sys.executable, os.path.join(BENCH_DIR, 'fake_reddit.py'), '--port', '0',
+           '--latency', str(args.latency), '--jitter', str(args.jitter),
+           '--error-rate', str(args.error_rate), '--throttle-rate', str(args.throttle_rate),
+           '--ratelimit', str(args.ratelimit), '--thread-size', str(args.thread_size)]
+    if args.fixtures:
+        cmd += ['--fixtures', args.fixtures]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    url = proc.stdout.readline().strip()
+    if not url:
+        proc.kill()
+        raise RuntimeError("fake Reddit server did not start")
+    return proc, url
+
+def run_worker(kind, url, subreddits, posts, main_args):
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker', kind, '--url', url,
+           '--subreddits', str(subreddits), '--posts', str(posts), '--']
+    out = subprocess.run(cmd + main_args, check=True, stdout=subprocess.PIPE, text=True).stdout
+    # The fetcher prints progress; the result is the last line
+    return json.loads(out.strip().splitlines()[-1])
+
+def format_table(rows):
+    header = (f"{'subs':>6} {'posts':>6} {'main s':>8} {'req/s':>8} {'RSS MB':>7} "
+              f"{'cmt ms (stream/full)':>21} {'render s':>9} {'RSS MB':>7}")
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        m, c, r = row['main'], row['comments'], row['render']
+        lines.append(
+            f"{row['subreddits']:>6} {r['posts']:>6} {m['wall_s']:>8.2f} {m['requests_per_s']:>8.1f} "
+            f"{m['peak_rss_mb']:>7.1f} {c['stream_ms_per_post']:>10.1f}/{c['full_ms_per_post']:<10.1f} "
+            f"{r['render_s']:>9.3f} {r['peak_rss_mb']:>7.1f}"
+        )
+    return '\n'.join(lines)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark fetch_reddit.py against a local fake Reddit.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100, 1000],
+                        help="numbers of subreddits to benchmark")
+    parser.add_argument('--posts', type=int, default=3, help="posts per subreddit")
+    parser.add_argument('--latency', type=float, default=0.02, help="fake server mean latency (s)")
+    parser.add_argument('--jitter', type=float, default=0.005)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--ratelimit', type=int, default=10 ** 9,
+                        help="fake X-Ratelimit budget per window (default: effectively unlimited)")
+    parser.add_argument('--thread-size', type=int, default=50, help="top-level comments per thread")
+    parser.add_argument('--fixtures', help="directory of recorded payloads for the fake server")
+    parser.add_argument('--json', help="also write the results to this file")
+    # Internal: run one measurement and print its result as JSON
+    parser.add_argument('--worker', choices=sorted(WORKERS), help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--subreddits', type=int, default=10, help=argparse.SUPPRESS)
+    parser.add_argument('main_args', nargs='*',
+                        help="extra arguments for fetch_reddit.main(), after --")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        print(json.dumps(WORKERS[args.worker](args)))
+        return 0
+
+    proc, url = start_server(args)
+    rows = []
+    try:
+        for scale in args.scales:
+            row = {'subreddits': scale}
+            for kind in ('main', 'comments', 'render'):
+                row[kind] = run_worker(kind, url, scale, args.posts, args.main_args)
+            rows.append(row)
+            print(f"r/ x{scale}: done", file=sys.stderr)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(format_table(rows))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
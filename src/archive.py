@@ -0,0 +1,172 @@
+import os
+import time
+import sqlite3
+import datetime
+from models import Comment, Post, Reply
+
+# Every post the feed has fetched, with its comments, kept across runs in
+# SQLite. Posts are keyed by id and indexed by subreddit/creation date and
+# by the day they were last shown, which is what the duplicate check and the
+# weekly digest query. Counters (ups, num_comments) are refreshed whenever a
+# post is fetched again.
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS posts (
+    post_id TEXT PRIMARY KEY,
+    subreddit TEXT NOT NULL,
+    title TEXT NOT NULL,
+    author TEXT,
+    permalink TEXT NOT NULL,
+    selftext TEXT,
+    media_type TEXT,
+    media_url TEXT,
+    dash_url TEXT,
+    hls_url TEXT,
+    preview_url TEXT,
+    preview_width INTEGER,
+    preview_height INTEGER,
+    ups INTEGER NOT NULL DEFAULT 0,
+    num_comments INTEGER NOT NULL DEFAULT 0,
+    created_utc INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_shown TEXT  -- UTC date, YYYY-MM-DD
+);
+CREATE INDEX IF NOT EXISTS posts_subreddit_created ON posts (subreddit, created_utc);
+CREATE INDEX IF NOT EXISTS posts_created ON posts (created_utc);
+CREATE INDEX IF NOT EXISTS posts_last_shown ON posts (last_shown);
+CREATE TABLE IF NOT EXISTS comments (
+    post_id TEXT NOT NULL REFERENCES posts (post_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    parent INTEGER,  -- position of the comment a reply belongs to
+    author TEXT,
+    body TEXT,
+    ups INTEGER NOT NULL DEFAULT 0,
+    created_utc INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (post_id, position)
+);
+'''
+
+POST_COLUMNS = ('post_id', 'subreddit', 'title', 'author', 'permalink', 'selftext', 'media_type',
+                'media_url', 'dash_url', 'hls_url', 'preview_url', 'preview_width', 'preview_height',
+                'ups', 'num_comments', 'created_utc')
+
+def utc_day(timestamp=None, days_ago=0):
+    moment = datetime.datetime.utcfromtimestamp(time.time() if timestamp is None else timestamp)
+    return (moment - datetime.timedelta(days=days_ago)).strftime("%Y-%m-%d")
+
+class Archive:
+    def __init__(self, path):
+        self.path = path
+        self.stored = 0  # posts written this run
+        self.skipped = 0  # listing entries left out as already shown
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript(SCHEMA)
+
+    # Ids among `post_ids` shown on one of the `days` days before today (UTC).
+    # Posts shown earlier today are not included, so a second run on the same
+    # day rebuilds the same page.
+    def shown_before(self, post_ids, days):
+        if days <= 0 or not post_ids:
+            return set()
+        post_ids = list(post_ids)
+        shown = set()
+        for i in range(0, len(post_ids), 500):  # stay under SQLite's variable limit
+            chunk = post_ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT post_id FROM posts WHERE last_shown >= ? AND last_shown < ? "
+                f"AND post_id IN ({','.join('?' * len(chunk))})",
+                [utc_day(days_ago=days), utc_day()] + chunk,
+            )
+            shown.update(row[0] for row in rows)
+        self.skipped += len(shown)
+        return shown
+
+    # Upsert `posts` and replace their stored comments. Posts in
+    # `keep_comments` (ids of those whose comments this run could not fetch)
+    # keep the comments already stored for them.
+    def store(self, posts, now=None, keep_comments=()):
+        now = time.time() if now is None else now
+        columns = ', '.join(POST_COLUMNS)
+        updates = ', '.join(f'{c} = excluded.{c}' for c in POST_COLUMNS[1:])
+        replaced = [post for post in posts if post.post_id not in keep_comments]
+        comment_rows = []
+        for post in replaced:
+            position = 0
+            for comment in post.comments:
+                parent = position
+                comment_rows.append((post.post_id, position, None, comment.author, comment.body,
+                                     comment.ups, comment.created_utc))
+                position += 1
+                for reply in comment.replies:
+                    comment_rows.append((post.post_id, position, parent, reply.author, reply.body,
+                                         reply.ups, reply.created_utc))
+                    position += 1
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO posts ({columns}, first_seen, last_seen) "
+                f"VALUES ({', '.join('?' * len(POST_COLUMNS))}, ?, ?) "
+                f"ON CONFLICT (post_id) DO UPDATE SET {updates}, last_seen = excluded.last_seen",
+                [tuple(getattr(post, c) for c in POST_COLUMNS) + (now, now) for post in posts],
+            )
+            self.conn.executemany("DELETE FROM comments WHERE post_id = ?",
+                                  [(post.post_id,) for post in replaced])
+            self.conn.executemany("INSERT INTO comments VALUES (?, ?, ?, ?, ?, ?, ?)", comment_rows)
+        self.stored += len(posts)
+
+    def mark_shown(self, post_ids, day=None):
+        day = day or utc_day()
+        with self.conn:
+            self.conn.executemany("UPDATE posts SET last_shown = ? WHERE post_id = ?",
+                                  [(day, post_id) for post_id in post_ids])
+
+    def _comments(self, post_ids):
+        comments = {post_id: {} for post_id in post_ids}
+        for i in range(0, len(post_ids), 500):
+            chunk = post_ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT post_id, position, parent, author, body, ups, created_utc FROM comments "
+                f"WHERE post_id IN ({','.join('?' * len(chunk))}) ORDER BY post_id, position",
+                chunk,
+            )
+            for post_id, position, parent, author, body, ups, created_utc in rows:
+                if parent is None:
+                    comments[post_id][position] = Comment(author=author, body=body, ups=ups,
+                                                          created_utc=created_utc, replies=[])
+                else:
+                    comments[post_id][parent].replies.append(
+                        Reply(author=author, body=body, ups=ups, created_utc=created_utc))
+        return {post_id: list(by_position.values()) for post_id, by_position in comments.items()}
+
+    # Highest-scoring posts created in the last `days` days, optionally
+    # restricted to some subreddits
+    def top_posts(self, days=7, limit=30, subreddits=None):
+        query = f"SELECT {', '.join(POST_COLUMNS)} FROM posts WHERE created_utc >= ?"
+        params = [int(time.time()) - days * 24 * 60 * 60]
+        if subreddits:
+            query += f" AND subreddit IN ({','.join('?' * len(subreddits))})"
+            params.extend(subreddits)
+        query += " ORDER BY ups DESC, post_id LIMIT ?"
+        params.append(limit)
+        rows = self.conn.execute(query, params).fetchall()
+        comments = self._comments([row[0] for row in rows])
+        return [Post(**dict(zip(POST_COLUMNS, row)), thumbnail=None, comments=comments[row[0]])
+                for row in rows]
+
+    # Forget posts not seen for `days` days
+    def prune(self, days):
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM posts WHERE last_seen < ?",
+                                       (time.time() - days * 24 * 60 * 60,))
+        return cursor.rowcount
+
+    def summary(self):
+        total = self.conn.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+        return (f"Archive: {self.stored} posts stored, {self.skipped} skipped as already shown, "
+                f"{total} archived")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import threading
+
+# Journal of the fetches a run has completed, so a run that dies or ends
+# with failures can be resumed without fetching everything again. Each line
+# is one JSON record, appended and flushed as soon as the fetch finishes:
+#
+#   {"type": "run", "plan": ..., "started": ...}            first line
+#   {"type": "listing", "subreddit": ..., "posts": [...]}   listing entries
+#   {"type": "comments", "post_id": ..., "items": [...]}    top-level comment things
+#
+# A journal is only resumed by a run with the same fetch plan within
+# `max_age` seconds of the run that started it; otherwise it is started
+# afresh. A torn last line (the process died mid-write) is dropped.
+class Checkpoint:
+    def __init__(self, path, plan, max_age=6 * 60 * 60, resume=True):
+        self.path = path
+        self.plan = plan
+        self.resumed_listings = 0
+        self.resumed_comments = 0
+        self._lock = threading.Lock()
+        self._listings = {}
+        self._comments = {}
+        records = self._load(max_age) if resume else []
+        if not records:
+            records = [{'type': 'run', 'plan': plan, 'started': time.time()}]
+        # Rewritten rather than appended to, so a torn line never ends up mid-file
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+        for record in records:
+            self._append(record)
+
+    # Records of a journal this run can resume, or []
+    def _load(self, max_age):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+        if (not records or records[0].get('type') != 'run' or records[0].get('plan') != self.plan
+                or time.time() - records[0].get('started', 0) > max_age):
+            return []
+        for record in records[1:]:
+            if record['type'] == 'listing':
+                self._listings[record['subreddit']] = record['posts']
+            elif record['type'] == 'comments':
+                self._comments[record['post_id']] = record['items']
+        return records
+
+    def _append(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._file.flush()
+
+    # Listing entries saved by an earlier attempt, or None
+    def listing(self, subreddit):
+        posts = self._listings.get(subreddit)
+        if posts is not None:
+            with self._lock:
+                self.resumed_listings += 1
+        return posts
+
+    def save_listing(self, subreddit, posts):
+        self._append({'type': 'listing', 'subreddit': subreddit, 'posts': posts})
+
+    # Raw comments (as get_comment_children() returned them) saved by an
+    # earlier attempt, or None
+    def comments(self, post_id):
+        raw = self._comments.get(post_id)
+        if raw is not None:
+            with self._lock:
+                self.resumed_comments += 1
+        return raw
+
+    def save_comments(self, post_id, raw):
+        self._append({'type': 'comments', 'post_id': post_id, 'items': raw})
+
+    def summary(self):
+        return (f"Checkpoint: resumed {self.resumed_listings} listings and "
+                f"{self.resumed_comments} comment trees")
+
+    # Finish the journal; it is deleted when the run needs no resuming
+    def close(self, complete):
+        with self._lock:
+            self._file.close()
+        if complete:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
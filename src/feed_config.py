@@ -0,0 +1,101 @@
+import json
+from dataclasses import dataclass, replace
+
+# A feeds config file defines several pages built from one fetch:
+#
+#   {
+#     "feeds": [
+#       {"name": "main", "output": "docs/index.html",
+#        "subreddits": {"singularity": 8, "chatgpt": 3}},
+#       {"name": "ai", "output": "docs/ai.html",
+#        "subreddits": {"singularity": 3, "chatgptcoding": 3},
+#        "comment_limit": 2, "reply_limit": 0}
+#     ]
+#   }
+#
+# "comment_limit", "reply_limit", "template" and "page_size" (posts per page,
+# 0 for a single page) are optional. Every listing and comment tree is
+# fetched once, with the largest limits any feed asks for, and each feed
+# takes its share of the shared posts.
+
+@dataclass
+class Feed:
+    __slots__ = ('name', 'output', 'subreddits', 'comment_limit', 'reply_limit', 'template', 'page_size')
+    name: str
+    output: str
+    subreddits: dict
+    comment_limit: int
+    reply_limit: int
+    template: str
+    page_size: int
+
+def _limit(value, what):
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError(f"{what} must be a non-negative integer, got {value!r}")
+    return value
+
+def parse_feed(data, comment_limit=3, reply_limit=3, template='index.html', page_size=0):
+    name = data.get('name') or data.get('output')
+    if not data.get('output'):
+        raise ValueError(f"feed {name!r} has no output path")
+    subreddits = data.get('subreddits')
+    if not isinstance(subreddits, dict) or not subreddits:
+        raise ValueError(f"feed {name!r} needs a non-empty subreddits object")
+    return Feed(
+        name=name,
+        output=data['output'],
+        subreddits={sub: _limit(limit, f"feed {name!r}: r/{sub} post limit")
+                    for sub, limit in subreddits.items()},
+        comment_limit=_limit(data.get('comment_limit', comment_limit), f"feed {name!r}: comment_limit"),
+        reply_limit=_limit(data.get('reply_limit', reply_limit), f"feed {name!r}: reply_limit"),
+        template=data.get('template', template),
+        page_size=_limit(data.get('page_size', page_size), f"feed {name!r}: page_size"),
+    )
+
+# Feeds from a config file; raises ValueError when the file is malformed
+def load_feeds(path, comment_limit=3, reply_limit=3, template='index.html', page_size=0):
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    feeds = [parse_feed(data, comment_limit, reply_limit, template, page_size)
+             for data in config.get('feeds', [])]
+    if not feeds:
+        raise ValueError(f"{path} defines no feeds")
+    outputs = [feed.output for feed in feeds]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError(f"{path}: two feeds write to the same output")
+    return feeds
+
+# What one fetch has to cover for all `feeds`:
+# (subreddit -> largest post limit, largest comment limit, largest reply limit)
+def fetch_plan(feeds):
+    subreddits = {}
+    for feed in feeds:
+        for sub, limit in feed.subreddits.items():
+            subreddits[sub] = max(limit, subreddits.get(sub, 0))
+    comment_limit = max(feed.comment_limit for feed in feeds)
+    reply_limit = max(feed.reply_limit for feed in feeds)
+    return subreddits, comment_limit, reply_limit
+
+def group_by_subreddit(posts):
+    groups = {}
+    for post in posts:
+        groups.setdefault(post.subreddit, []).append(post)
+    return groups
+
+def _trim(post, comment_limit, reply_limit):
+    comments = post.comments[:comment_limit]
+    if any(len(c.replies) > reply_limit for c in comments):
+        comments = [replace(c, replies=c.replies[:reply_limit]) for c in comments]
+    if len(comments) == len(post.comments) and all(a is b for a, b in zip(comments, post.comments)):
+        return post
+    return replace(post, comments=comments)
+
+# The posts `feed` shows, in its subreddit order, from the shared fetch
+# grouped by subreddit. Listings are ranked, so a smaller limit is a prefix
+# of a larger one. Shared posts are copied only when comments are trimmed.
+def select_posts(feed, posts_by_subreddit):
+    selected = []
+    for sub, limit in feed.subreddits.items():
+        for post in posts_by_subreddit.get(sub, [])[:limit]:
+            selected.append(_trim(post, feed.comment_limit, feed.reply_limit))
+    return selected
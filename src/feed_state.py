@@ -0,0 +1,68 @@
+import os
+import json
+import time
+import threading
+from models import comment_from_dict, comment_to_dict
+
+# Remembers, per post, the listing counters and comments from earlier runs so
+# a comment tree is only downloaded again when the post is new, its comment
+# count grew by at least `threshold`, the stored copy is older than `max_age`
+# seconds, or it was fetched with different comment limits.
+class FeedState:
+    def __init__(self, path, threshold=10, max_age=24 * 60 * 60):
+        self.path = path
+        self.threshold = threshold
+        self.max_age = max_age
+        self.reused = 0  # comment trees served from the state file
+        self.fetched = 0  # comment trees downloaded this run
+        self._lock = threading.Lock()
+        self._posts = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._posts = json.load(f).get('posts', {})
+        except (OSError, ValueError):
+            pass
+
+    # Stored comments for a listing entry, or None when they must be refetched
+    def reuse(self, data, limit, reply_limit):
+        with self._lock:
+            entry = self._posts.get(data['id'])
+        if (entry is None
+                or entry['limits'] != [limit, reply_limit]
+                or time.time() - entry['fetched_at'] > self.max_age
+                or data.get('num_comments', 0) - entry['num_comments'] >= self.threshold):
+            return None
+        with self._lock:
+            self.reused += 1
+            entry['ups'] = data.get('ups', 0)
+            entry['seen_at'] = time.time()
+        return [comment_from_dict(c) for c in entry['comments']]
+
+    def record(self, data, limit, reply_limit, comments):
+        now = time.time()
+        entry = {
+            'ups': data.get('ups', 0),
+            'num_comments': data.get('num_comments', 0),
+            'fetched_at': now,
+            'seen_at': now,
+            'limits': [limit, reply_limit],
+            'comments': [comment_to_dict(c) for c in comments],
+        }
+        with self._lock:
+            self.fetched += 1
+            self._posts[data['id']] = entry
+
+    def summary(self):
+        return (f"Incremental: {self.reused} comment trees reused ({self.reused} requests avoided), "
+                f"{self.fetched} fetched")
+
+    # Write the state back, dropping posts not seen within max_age
+    def save(self):
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            posts = {pid: e for pid, e in self._posts.items() if e['seen_at'] >= cutoff}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'posts': posts}, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
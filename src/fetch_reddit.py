@@ -1,8 +1,31 @@
 import os
+import time
 import random
+import hashlib
+import asyncio
+import argparse
+import functools
+import contextlib
 import requests
 import datetime
-from jinja2 import Template
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from rate_limit import RateLimiter
+from http_cache import ResponseCache
+from reddit_client import RedditClient
+from token_cache import TokenProvider
+from models import PREVIEW_WIDTH, comment_children, format_utc, parse_comments
+from normalize import PostJob, normalize_posts
+from media import MediaStage
+from archive import Archive
+from scheduler import FetchBudget, RefreshSchedule, RetryBudget, call_with_retries, comment_priority
+from checkpoint import Checkpoint
+from feed_state import FeedState
+from feed_config import Feed, fetch_plan, group_by_subreddit, load_feeds, select_posts
+from paged_output import (data_dir, feed_index, page_paths, paginate, prune_pages,
+                          write_comment_fragments, write_json)
+from instrumentation import TimedWriter, Tracer
 
 # Reddit API Configuration
 CLIENT_ID = os.environ.get('REDDIT_CLIENT_ID')
@@ -11,6 +34,58 @@ USERNAME = os.environ.get('REDDIT_USERNAME')
 PASSWORD = os.environ.get('REDDIT_PASSWORD')
 USER_AGENT = "DailyFeedScript/1.0"
 
+# Fetch Configuration
+# Overridable so the fetch can be pointed at a local stand-in (see bench/)
+API_BASE = os.environ.get('REDDIT_API_BASE', 'https://oauth.reddit.com').rstrip('/')
+AUTH_URL = os.environ.get('REDDIT_AUTH_URL', 'https://www.reddit.com/api/v1/access_token')
+API_HOST = urlsplit(API_BASE).netloc
+# All fetches go to API_HOST, so the per-host cap is what bounds them; the
+# overall cap only bites once requests are spread over several hosts
+MAX_CONCURRENCY = int(os.environ.get('FETCH_CONCURRENCY', 8))  # requests in flight overall
+MAX_PER_HOST = int(os.environ.get('FETCH_PER_HOST', MAX_CONCURRENCY))  # requests in flight per host
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', MAX_PER_HOST))  # keep-alive connections per host
+STREAM_COMMENTS = os.environ.get('STREAM_COMMENTS', '1') != '0'  # parse comment trees incrementally
+HTTP_TIMEOUT = (float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10)),  # seconds to connect...
+                float(os.environ.get('HTTP_READ_TIMEOUT', 30)))  # ...and between bytes of a response
+MAX_RETRIES = int(os.environ.get('FETCH_MAX_RETRIES', 5))  # retries for 429/5xx responses
+FETCH_BUDGET = int(os.environ.get('FETCH_BUDGET', 0))  # listing + comment fetches per run; 0 = no limit
+FETCH_DEADLINE = float(os.environ.get('FETCH_DEADLINE', 0))  # seconds before new fetches stop; 0 = none
+RETRY_BUDGET = int(os.environ.get('FETCH_RETRY_BUDGET', 10))  # retries of failed fetches per run
+CHECKPOINT_MAX_AGE = int(os.environ.get('CHECKPOINT_MAX_AGE', 6 * 60 * 60))  # resume window in seconds
+WATCH_INTERVAL = int(os.environ.get('WATCH_INTERVAL', 60 * 60))  # seconds between refreshes in --watch
+WATCH_MAX_INTERVAL = int(os.environ.get('WATCH_MAX_INTERVAL', 6 * 60 * 60))  # for subreddits that rarely change
+
+# Cache Configuration
+CACHE_DIR = os.environ.get('FEED_CACHE_DIR', '.cache')  # persisted between workflow runs
+HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+HTTP_CACHE_TTLS = [
+    # (URL path pattern, seconds a response is reused without asking Reddit)
+    (r'^/r/[^/]+/top$', 10 * 60),
+    (r'^/r/[^/]+/comments/', 30 * 60),
+]
+TOKEN_REFRESH_MARGIN = int(os.environ.get('TOKEN_REFRESH_MARGIN', 5 * 60))  # refresh this early
+
+# Output Configuration
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+OUTPUT_PATH = "docs/index.html"
+RENDER_BUFFER = 16  # template chunks joined per write
+# Posts per page; 0 writes one page with every comment inline, anything else
+# writes numbered pages plus a feed.json index and per-post comment files
+PAGE_SIZE = int(os.environ.get('FEED_PAGE_SIZE', 0))
+
+# Archive Configuration
+# Posts and comments of every run are kept in an SQLite archive in the cache dir
+ARCHIVE_MAX_AGE = int(os.environ.get('ARCHIVE_MAX_AGE', 90))  # days a post is kept after last seen
+SKIP_SHOWN_DAYS = int(os.environ.get('SKIP_SHOWN_DAYS', 0))  # leave out posts shown on the last N days
+DIGEST_PATH = "docs/weekly.html"
+DIGEST_DAYS = 7
+DIGEST_LIMIT = 30  # posts on the digest page
+
+# Media Configuration
+MEDIA_DIR = "docs/media"  # local thumbnails, named by content hash
+MEDIA_WIDTH = int(os.environ.get('MEDIA_WIDTH', PREVIEW_WIDTH))  # thumbnail width in pixels
+MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 8))  # parallel media downloads
+
 # Subreddit Configuration
 SUBREDDITS = {
     'singularity': 8,  # subreddit name: number of posts
@@ -24,494 +99,750 @@ SUBREDDITS = {
     'cars': 1
     # Add more subreddits and their post limits here
 }
+COMMENT_LIMIT = 3  # top-level comments shown per post
+REPLY_LIMIT = 3  # replies shown per comment
 
-# Get an OAuth token
-def get_token():
-    auth = requests.auth.HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET)
-    data = {
-        'grant_type': 'password',
-        'username': USERNAME,
-        'password': PASSWORD
+# Incremental Build Configuration
+# Stored comments are reused until a post gains this many comments...
+COMMENT_REFRESH_THRESHOLD = int(os.environ.get('COMMENT_REFRESH_THRESHOLD', 10))
+# ...or the stored copy is older than this many seconds
+COMMENT_MAX_AGE = int(os.environ.get('COMMENT_MAX_AGE', 24 * 60 * 60))
+
+# Get an OAuth token; returns (access_token, expires_in)
+def get_token(client):
+    with client.tracer.span('token'):
+        auth = requests.auth.HTTPBasicAuth(CLIENT_ID, CLIENT_SECRET)
+        data = {
+            'grant_type': 'password',
+            'username': USERNAME,
+            'password': PASSWORD
+        }
+        res = client.post(AUTH_URL, auth=auth, data=data)
+        res.raise_for_status()  # Added for error handling
+        payload = res.json()
+        # Bad credentials still get a 200, with {"error": "invalid_grant"}
+        if not isinstance(payload, dict) or 'error' in payload or 'access_token' not in payload:
+            error = payload.get('error') if isinstance(payload, dict) else None
+            raise ValueError(f"token request failed: {error or 'no access_token in response'}")
+        return payload['access_token'], payload.get('expires_in', 3600)
+
+def get_top_posts(client, subreddit='chatgpt', limit=20):
+    with client.tracer.span('listing', subreddit=subreddit):
+        # raw_json=1 returns text unescaped; the template does the HTML escaping
+        url = f'{API_BASE}/r/{subreddit}/top?t=day&limit={limit}&raw_json=1'
+        res = client.get(url)
+        res.raise_for_status()  # Added for error handling
+        posts = res.json()['data']['children']
+        return posts
+
+# Reddit counts every comment in the tree towards `limit`, so ask for enough
+# to cover the top-level comments plus their replies, with a little slack for
+# stickied/removed comments that get skipped
+def comment_request_params(limit, reply_limit):
+    return {
+        'sort': 'top',
+        'raw_json': 1,
+        'limit': (limit + 2) * (reply_limit + 1),
+        'depth': 2 if reply_limit else 1,  # top-level comments and their direct replies only
     }
-    headers = {'User-Agent': USER_AGENT}
-    res = requests.post('https://www.reddit.com/api/v1/access_token', auth=auth, data=data, headers=headers)
-    res.raise_for_status()  # Added for error handling
-    token = res.json()['access_token']
-    return token
-
-def get_top_posts(token, subreddit='chatgpt', limit=20):
-    headers = {'Authorization': f'bearer {token}', 'User-Agent': USER_AGENT}
-    url = f'https://oauth.reddit.com/r/{subreddit}/top?t=day&limit={limit}'
-    res = requests.get(url, headers=headers)
-    res.raise_for_status()  # Added for error handling
-    posts = res.json()['data']['children']
-    return posts
-
-def get_top_comments(token, subreddit, post_id, limit=3):
-    headers = {
-        'Authorization': f'bearer {token}',
-        'User-Agent': USER_AGENT
+
+# Where the comment listing sits in a /comments response: [ {post info}, {comment tree} ]
+COMMENT_TREE_PATH = (1, 'data', 'children')
+
+# The first `limit` top-level comment things among `children`
+def first_comments(children, limit):
+    kept = []
+    for c in children:
+        if c['kind'] == 't1':  # Skip "more" stubs
+            kept.append(c)
+            if len(kept) == limit:
+                break
+    return kept
+
+# The first `limit` top-level comments of a post as decoded JSON, left for
+# normalize_posts() to parse. Decoding happens here, in the fetch thread.
+def get_comment_children(client, subreddit, post_id, limit=3, reply_limit=3, stream=STREAM_COMMENTS):
+    with client.tracer.span('comments', subreddit=subreddit, post_id=post_id):
+        url = f'{API_BASE}/r/{subreddit}/comments/{post_id}'
+        params = comment_request_params(limit, reply_limit)
+        if stream:
+            # Decode the tree as it downloads and stop once `limit` comments are in
+            with contextlib.closing(client.iter_json(url, COMMENT_TREE_PATH, params=params, limit=limit)) as children:
+                return first_comments(children, limit)
+
+        res = client.get(url, params=params)
+        res.raise_for_status()  # Added for error handling
+        return first_comments(comment_children(res.json()), limit)
+
+def get_top_comments(client, subreddit, post_id, limit=3, reply_limit=3, stream=STREAM_COMMENTS):
+    children = get_comment_children(client, subreddit, post_id, limit, reply_limit, stream)
+    return parse_comments(children, limit, reply_limit)
+
+# Jinja environment shared by every render in this process; templates are
+# compiled once and the bytecode is cached on disk for the next run
+@functools.lru_cache(maxsize=None)
+def get_template_env(cache_dir=CACHE_DIR):
+    bytecode_dir = os.path.join(cache_dir, 'jinja')
+    os.makedirs(bytecode_dir, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(['html']),
+        bytecode_cache=FileSystemBytecodeCache(bytecode_dir),
+    )
+    env.filters['utcdate'] = format_utc
+    return env
+
+def render_date():
+    return datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M")
+
+# `extra` carries the media location and the page number and links of a paged feed
+def template_context(posts, date=None, **extra):
+    return {
+        'posts': posts,
+        'date': date or render_date(),
+        # The video player libraries are only loaded by pages that need them
+        'has_video': any(post.media_type == 'video' for post in posts),
+        **extra,
     }
-    url = f'https://oauth.reddit.com/r/{subreddit}/comments/{post_id}?sort=top'
-    res = requests.get(url, headers=headers)
-    res.raise_for_status()  # Added for error handling
-    comment_data = res.json()
-
-    # comment_data typically looks like: [ {post info}, {comment tree} ]
-    if (isinstance(comment_data, list) and len(comment_data) > 1 
-        and 'data' in comment_data[1] 
-        and 'children' in comment_data[1]['data']):
-        
-        all_children = comment_data[1]['data']['children']
-        
-        top_comments = []
-        for c in all_children:
-            if c['kind'] == 't1':  # Ensure it's a comment
-                c_data = c['data']
-                comment_author = c_data.get('author')
-                comment_body = c_data.get('body', '')
-                comment_ups = c_data.get('ups', 0)
-                
-                # Convert UNIX time to human-readable
-                comment_created_utc = c_data.get('created_utc', None)
-                if comment_created_utc:
-                    comment_date_str = datetime.datetime.utcfromtimestamp(comment_created_utc).strftime("%Y-%m-%d %H:%M")
-                else:
-                    comment_date_str = "N/A"
-
-                # Process replies if they exist
-                replies_data = c_data.get('replies')
-                replies = []
-                if isinstance(replies_data, dict):
-                    reply_children = replies_data['data'].get('children', [])
-                    for reply in reply_children[:3]:  # Limit replies to 3
-                        if reply['kind'] == 't1':
-                            r_data = reply['data']
-                            reply_author = r_data.get('author')
-                            reply_body = r_data.get('body', '')
-                            reply_ups = r_data.get('ups', 0)
-
-                            reply_created_utc = r_data.get('created_utc', None)
-                            if reply_created_utc:
-                                reply_date_str = datetime.datetime.utcfromtimestamp(reply_created_utc).strftime("%Y-%m-%d %H:%M")
-                            else:
-                                reply_date_str = "N/A"
-
-                            replies.append({
-                                'author': reply_author,
-                                'body': reply_body,
-                                'ups': reply_ups,
-                                'date': reply_date_str
-                            })
-
-                top_comments.append({
-                    'author': comment_author,
-                    'body': comment_body,
-                    'ups': comment_ups,
-                    'date': comment_date_str,
-                    'replies': replies
-                })
-
-                if len(top_comments) == limit:  # Limit top-level comments to 3
-                    break
-
-        return top_comments
-    else:
+
+def generate_html(posts, template_name='index.html', cache_dir=CACHE_DIR):
+    template = get_template_env(cache_dir).get_template(template_name)
+    return template.render(template_context(posts))
+
+# Render straight to `path` chunk by chunk instead of building the page in
+# memory. Rendering and writing interleave, so the tracer gets the time spent
+# in write() as the 'write' stage and the rest as 'render'.
+def write_html(posts, path, template_name='index.html', cache_dir=CACHE_DIR, tracer=None, **context):
+    start = time.perf_counter()
+    template = get_template_env(cache_dir).get_template(template_name)
+    stream = template.stream(template_context(posts, **context))
+    stream.enable_buffering(RENDER_BUFFER)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Written next to the page and renamed over it, so readers never see half a page
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        out = TimedWriter(f)
+        stream.dump(out)
+    os.replace(tmp_path, path)
+    if tracer is not None:
+        elapsed = time.perf_counter() - start
+        tracer.add_span('render', start, elapsed - out.seconds, path=path)
+        tracer.add_span('write', start, out.seconds, path=path)
+
+# Paged output: `page_size` posts per page with comments left out of the
+# HTML, next to a feed.json index and one comments file per post (see
+# paged_output.py). Returns the number of pages.
+def write_paged(posts, path, page_size, template_name='index.html', cache_dir=CACHE_DIR, tracer=None,
+                **context):
+    date = render_date()
+    pages = paginate(posts, page_size)
+    paths = page_paths(path, len(pages))
+    hrefs = [os.path.basename(p) for p in paths]
+    data = data_dir(path)
+    comments_href = f'{os.path.basename(data)}/comments'
+    for number, (page_posts, page_path) in enumerate(zip(pages, paths), 1):
+        write_html(page_posts, page_path, template_name, cache_dir, tracer,
+                   date=date, page=number, pages=hrefs, comments_href=comments_href, **context)
+
+    start = time.perf_counter()
+    write_comment_fragments(posts, os.path.join(data, 'comments'))
+    write_json(os.path.join(data, 'feed.json'), feed_index(pages, hrefs, comments_href, date))
+    prune_pages(path, len(pages))
+    if tracer is not None:
+        tracer.add_span('write', start, time.perf_counter() - start, path=data)
+    return len(pages)
+
+# Comments a listing entry needs no request for: reused from the feed state
+# when still current, or none at all when the post has nothing to show.
+# None means the comment tree has to be fetched.
+def known_comments(data, state=None, limit=COMMENT_LIMIT, reply_limit=REPLY_LIMIT, budget=None):
+    if state is not None:
+        comments = state.reuse(data, limit, reply_limit)
+        if comments is not None:
+            return comments
+    if comment_priority(data, limit) is None:
+        if budget is not None:
+            budget.skip_empty()
         return []
+    return None
 
-def generate_html(posts):
-    # Notice this is now a single list (posts), not grouped by subreddit
-    template_str = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Daily Reddit Feed</title>
-        <style>
-            :root {
-                --primary-color: #1a1a1b;
-                --secondary-color: #ffffff;
-                --accent-color: #ff4500;
-                --border-color: #343536;
-                --card-bg: #222222;
-                --comment-bg: #2d2d2d;
-                --reply-bg: #3a3a3a;
-            }
-            * {
-                box-sizing: border-box;
-                margin: 0;
-                padding: 0;
-            }
-            body {
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
-                padding: 1rem;
-                background: var(--primary-color);
-                color: var(--secondary-color);
-                line-height: 1.6;
-            }
-            .container {
-                max-width: 800px;
-                margin: 0 auto;
-            }
-            h1 {
-                text-align: center;
-                color: var(--accent-color);
-                font-size: clamp(1.5rem, 5vw, 2.5rem);
-                margin: 1rem 0;
-            }
-            .update-time {
-                text-align: center;
-                color: #808080;
-                margin-bottom: 2rem;
-                font-size: 0.9rem;
-            }
-            .post {
-                margin-bottom: 2rem;
-                padding: 1.25rem;
-                border: 1px solid var(--border-color);
-                border-radius: 12px;
-                background: var(--card-bg);
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }
-            .subreddit-name {
-                color: var(--accent-color);
-                font-weight: 600;
-                margin-bottom: 0.5rem;
-                font-size: 0.9rem;
-            }
-            .post-title {
-                font-size: clamp(1.1rem, 4vw, 1.4rem);
-                font-weight: bold;
-                margin-bottom: 0.75rem;
-            }
-            .post-title a {
-                color: var(--secondary-color);
-                text-decoration: none;
-            }
-            .post-title a:hover {
-                color: var(--accent-color);
-            }
-            .post-meta {
-                display: flex;
-                flex-wrap: wrap;
-                gap: 1rem;
-                margin-bottom: 1rem;
-                font-size: 0.9rem;
-            }
-            .post-stats, .post-author, .post-date {
-                color: #b3b3b3;
-            }
-            .post-content {
-                margin: 1rem 0;
-                font-size: 0.95rem;
-            }
-            .media-container {
-                margin: 1rem 0;
-                border-radius: 8px;
-                overflow: hidden;
-            }
-            .media-container img, .media-container video {
-                width: 100%;
-                height: auto;
-                display: block;
-            }
-            .comment-section-title {
-                font-size: 1.1rem;
-                margin: 1.5rem 0 1rem;
-                padding-bottom: 0.5rem;
-                border-bottom: 1px solid var(--border-color);
-            }
-            /* Comments and replies */
-            .comment {
-                margin: 1rem 0;
-                padding: 1rem;
-                border-left: 3px solid var(--accent-color);
-                background: var(--comment-bg);
-                border-radius: 0 8px 8px 0;
-            }
-            .comment-header {
-                display: flex;
-                flex-wrap: wrap;
-                gap: 0.5rem;
-                align-items: baseline;
-                margin-bottom: 0.5rem;
-            }
-            .comment-author, .reply-author {
-                color: #4fbcff;
-                font-weight: 600;
-            }
-            .comment-meta, .reply-meta {
-                font-size: 0.8rem;
-                color: #b3b3b3;
-            }
-            .reply {
-                margin: 0.75rem 0 0 1rem;
-                padding: 0.75rem;
-                border-left: 2px solid var(--accent-color);
-                background: var(--reply-bg);
-                border-radius: 4px;
-            }
-            /* Toggle Buttons */
-            .toggle-button {
-                background-color: var(--accent-color);
-                border: none;
-                color: var(--secondary-color);
-                font-size: 0.85rem;
-                padding: 0.4rem 0.8rem;
-                cursor: pointer;
-                margin-bottom: 0.75rem;
-                border-radius: 4px;
-            }
-            /* Collapsed class to hide elements by default */
-            .collapsed {
-                display: none;
-            }
-            @media (max-width: 600px) {
-                body {
-                    padding: 0.5rem;
-                }
-                .post {
-                    padding: 1rem;
-                    margin-bottom: 1rem;
-                }
-                .reply {
-                    margin-left: 0.5rem;
-                }
-                .comment {
-                    padding: 0.75rem;
-                }
-            }
-        </style>
-        <!-- Include dash.js and hls.js libraries -->
-        <script src="https://cdn.dashjs.org/latest/dash.all.min.js"></script>
-        <script src="https://cdn.jsdelivr.net/npm/hls.js@latest"></script>
-    </head>
-    <body>
-        <div class="container">
-            <h1>Daily Top Reddit Posts</h1>
-            <p class="update-time">Updated on {{date}} UTC</p>
-            
-            {% for post in posts %}
-            <div class="post">
-                <div class="subreddit-name">r/{{ post.subreddit }}</div>
-                <div class="post-title"><a href="{{ post.url }}" target="_blank">{{ post.title }}</a></div>
-                <div class="post-meta">
-                    <span class="post-stats">↑ {{ post.ups }} | {{ post.num_comments }} comments</span>
-                    <span class="post-author">u/{{ post.author }}</span>
-                    <span class="post-date">{{ post.post_date }}</span>
-                </div>
-                
-                {% if post.selftext %}
-                <div class="post-content">{{ post.selftext }}</div>
-                {% endif %}
-                
-                {% if post.media_type == 'image' %}
-                <div class="media-container">
-                    <img src="{{ post.media_url }}" alt="Post image" loading="lazy">
-                </div>
-                {% elif post.media_type == 'video' %}
-                <div class="media-container">
-                    <video id="video{{ post.post_id }}" controls playsinline></video>
-                </div>
-                <script>
-                    document.addEventListener("DOMContentLoaded", function() {
-                        var dashUrl = "{{ post.dash_url }}";
-                        var hlsUrl = "{{ post.hls_url }}";
-                        var fallbackUrl = "{{ post.media_url }}";
-                        var videoElement = document.querySelector("#video{{ post.post_id }}");
-
-                        if (dashUrl) {
-                            // Use dash.js if DASH manifest is available
-                            var player = dashjs.MediaPlayer().create();
-                            player.initialize(videoElement, dashUrl, true);
-                        } else if (hlsUrl) {
-                            // Use hls.js if Hls url is available
-                            if (Hls.isSupported()) {
-                                var hls = new Hls();
-                                hls.loadSource(hlsUrl);
-                                hls.attachMedia(videoElement);
-                            } else if (videoElement.canPlayType('application/vnd.apple.mpegurl')) {
-                                // Some browsers (Safari) may support HLS natively
-                                videoElement.src = hlsUrl;
-                            } else {
-                                // fallback no audio scenario
-                                videoElement.src = fallbackUrl;
-                            }
-                        } else {
-                            // fallback no audio scenario
-                            videoElement.src = fallbackUrl;
-                        }
-                    });
-                </script>
-                {% endif %}
-                
-                {% if post.comments %}
-                <h3 class="comment-section-title">Top Comments</h3>
-                <!-- Button to toggle the entire comment section -->
-                <button class="toggle-button toggle-comment-section">Show Comments</button>
-                <div class="comments-wrapper collapsed">
-                    {% for comment in post.comments %}
-                    <div class="comment">
-                        <div class="comment-header">
-                            <span class="comment-author">u/{{ comment.author }}</span>
-                            <span class="comment-meta">↑ {{ comment.ups }} | {{ comment.date }}</span>
-                        </div>
-                        <div class="comment-body">{{ comment.body }}</div>
-                        
-                        {% if comment.replies %}
-                        <!-- Button to toggle replies for this comment -->
-                        <button class="toggle-button toggle-replies">Show Replies</button>
-                        <div class="replies collapsed">
-                            {% for reply in comment.replies %}
-                            <div class="reply">
-                                <div class="comment-header">
-                                    <span class="reply-author">u/{{ reply.author }}</span>
-                                    <span class="reply-meta">↑ {{ reply.ups }} | {{ reply.date }}</span>
-                                </div>
-                                <div class="reply-body">{{ reply.body }}</div>
-                            </div>
-                            {% endfor %}
-                        </div>
-                        {% endif %}
-                    </div>
-                    {% endfor %}
-                </div>
-                {% endif %}
-            </div>
-            {% endfor %}
-        </div>
-
-        <script>
-            document.addEventListener("DOMContentLoaded", function() {
-                // Toggle entire comment sections
-                var commentSectionToggles = document.querySelectorAll(".toggle-comment-section");
-                commentSectionToggles.forEach(button => {
-                    button.addEventListener("click", function() {
-                        var commentSection = button.nextElementSibling;
-                        if (commentSection.classList.contains("collapsed")) {
-                            commentSection.classList.remove("collapsed");
-                            button.textContent = "Hide Comments";
-                        } else {
-                            commentSection.classList.add("collapsed");
-                            button.textContent = "Show Comments";
-                        }
-                    });
-                });
-
-                // Toggle replies within each comment
-                var repliesToggles = document.querySelectorAll(".toggle-replies");
-                repliesToggles.forEach(button => {
-                    button.addEventListener("click", function() {
-                        var repliesSection = button.nextElementSibling;
-                        if (repliesSection.classList.contains("collapsed")) {
-                            repliesSection.classList.remove("collapsed");
-                            button.textContent = "Hide Replies";
-                        } else {
-                            repliesSection.classList.add("collapsed");
-                            button.textContent = "Show Replies";
-                        }
-                    });
-                });
-            });
-        </script>
-    </body>
-    </html>
-    """
-    template = Template(template_str)
-    html = template.render(
-        posts=posts,
-        date=datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M")
-    )
-    return html
+# Listing entries minus those `skip` reports as already shown, at most `limit`.
+# With a `skip`, listings are requested with headroom so skipped posts can
+# be replaced by the next ones down.
+def listing_limit(limit, skip=None):
+    return min(100, 2 * limit) if skip is not None else limit
 
-def main():
-    try:
-        token = get_token()
-    except requests.exceptions.RequestException as e:
-        print(f"Error obtaining token: {e}")
+def drop_shown(posts, limit, skip=None):
+    if skip is None:
+        return posts
+    shown = skip([p['data']['id'] for p in posts])
+    return [p for p in posts if p['data']['id'] not in shown][:limit]
+
+# Record freshly fetched comments in the feed state for the next run
+def record_comments(state, jobs, posts):
+    if state is None:
         return
+    for job, post in zip(jobs, posts):
+        if job.comments is None:
+            state.record(job.data, job.limit, job.reply_limit, post.comments)
+
+# Original one-request-at-a-time fetch, kept for debugging (--serial).
+# All listings come first, then comment trees in priority order. The ids of
+# posts shown without comments because their fetch failed or was refused go
+# into `missing_comments`, when given.
+def fetch_posts_serial(client, stream=STREAM_COMMENTS, state=None, subreddits=None,
+                       comment_limit=COMMENT_LIMIT, reply_limit=REPLY_LIMIT, skip=None,
+                       budget=None, retries=None, checkpoint=None, missing_comments=None):
+    budget = budget or FetchBudget()
+    retries = retries or RetryBudget(0)
+
+    listings = []
+    for subreddit, post_limit in (subreddits or SUBREDDITS).items():
+        posts = checkpoint.listing(subreddit) if checkpoint is not None else None
+        if posts is None:
+            if not budget.take():
+                print(f"Skipping r/{subreddit}: fetches stopped by the {budget.reason}")
+                continue
+            try:
+                posts = call_with_retries(retries, budget, f"r/{subreddit} listing", get_top_posts, client,
+                                          subreddit=subreddit, limit=listing_limit(post_limit, skip))
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Error fetching posts from r/{subreddit}: {e}")
+                continue
+            posts = drop_shown(posts, post_limit, skip)
+            if checkpoint is not None:
+                checkpoint.save_listing(subreddit, posts)
+        listings.append([
+            PostJob(subreddit=subreddit, data=p['data'],
+                    comments=known_comments(p['data'], state, comment_limit, reply_limit, budget),
+                    raw_comments=None, limit=comment_limit, reply_limit=reply_limit)
+            for p in posts
+        ])
+
+    # sort() is stable, so equal priorities keep the listing order
+    pending = [job for jobs in listings for job in jobs if job.comments is None]
+    pending.sort(key=lambda job: comment_priority(job.data, comment_limit), reverse=True)
+    for job in pending:
+        post_id = job.data['id']
+        raw = checkpoint.comments(post_id) if checkpoint is not None else None
+        if raw is None and budget.take():
+            try:
+                raw = call_with_retries(retries, budget, f"comments of {post_id}", get_comment_children,
+                                        client, job.subreddit, post_id, limit=comment_limit,
+                                        reply_limit=reply_limit, stream=stream)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Error fetching comments for post {post_id}: {e}")
+            else:
+                if checkpoint is not None:
+                    checkpoint.save_comments(post_id, raw)
+        if raw is None:
+            job.comments = []  # failed or out of budget: shown without comments, not recorded
+            if missing_comments is not None:
+                missing_comments.add(post_id)
+        else:
+            job.raw_comments = raw
 
     # List to store all posts from all subreddits
     combined_posts = []
+    for jobs in listings:
+        parsed = normalize_posts(jobs)
+        record_comments(state, jobs, parsed)
+        combined_posts.extend(parsed)
+
+    return combined_posts
+
+# Runs the blocking fetch functions concurrently on a thread pool.
+# A global semaphore caps the total number of requests in flight and a
+# per-host semaphore caps the requests sent to any single host. With a
+# single host the lower of the two is the effective limit, and the global
+# cap only matters when requests go to more than one host. Comment
+# trees wait in a priority queue. Under a budget or deadline the queue is
+# only served once every listing is in, so, as in the serial path, the most
+# promising posts of all subreddits get their comments first; without one
+# the fetches start right away. Each subreddit's raw
+# payloads are normalized once its comment trees are in. Failed fetches
+# are retried within the retry budget, completed ones go to the checkpoint,
+# and whatever a checkpoint already holds is not fetched again. Posts whose
+# comment fetch failed or was refused are noted in `missing_comments`.
+class FetchEngine:
+    def __init__(self, client, concurrency=MAX_CONCURRENCY, per_host=MAX_PER_HOST,
+                 stream=STREAM_COMMENTS, state=None, comment_limit=COMMENT_LIMIT, reply_limit=REPLY_LIMIT,
+                 skip=None, budget=None, retries=None, checkpoint=None, missing_comments=None):
+        self.client = client
+        self.stream = stream
+        self.state = state
+        self.skip = skip
+        self.budget = budget or FetchBudget()
+        self.retries = retries or RetryBudget(0)
+        self.checkpoint = checkpoint
+        self.missing_comments = missing_comments
+        self.comment_limit = comment_limit
+        self.reply_limit = reply_limit
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self._global_limit = None
+        self._host_limits = {}
+        self._executor = None
+        self._queue = None
+        self._queued = 0
+        self._listed = None  # set once the comment queue may be served
+        self._listings_left = 0
+
+    def _host_limit(self, host):
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def _call(self, host, func, *args, **kwargs):
+        # Wait for a host slot first so a queued request never holds a global slot
+        async with self._host_limit(host):
+            async with self._global_limit:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._executor, functools.partial(func, *args, **kwargs)
+                )
+
+    async def _call_with_retries(self, unit, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return await self._call(API_HOST, func, *args, **kwargs)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                attempt += 1
+                delay = self.retries.retry_delay(unit, e, attempt, self.budget)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    # Fetches queued comment trees, highest priority first. A refused or
+    # failed fetch resolves to None.
+    async def _comment_worker(self):
+        await self._listed.wait()
+        while True:
+            _, _, subreddit, data, future = await self._queue.get()
+            if not self.budget.take():
+                future.set_result(None)
+                continue
+            try:
+                raw = await self._call_with_retries(f"comments of {data['id']}", get_comment_children,
+                                                    self.client, subreddit, data['id'],
+                                                    limit=self.comment_limit, reply_limit=self.reply_limit,
+                                                    stream=self.stream)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Error fetching comments for post {data['id']}: {e}")
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                if self.checkpoint is not None:
+                    self.checkpoint.save_comments(data['id'], raw)
+                future.set_result(raw)
+
+    async def _post_job(self, subreddit, data):
+        # Reused or empty comments cost no request, so they skip the queue
+        comments = known_comments(data, self.state, self.comment_limit, self.reply_limit, self.budget)
+        raw = None
+        if comments is None and self.checkpoint is not None:
+            raw = self.checkpoint.comments(data['id'])
+        if comments is None and raw is None:
+            future = asyncio.get_running_loop().create_future()
+            self._queued += 1  # tie-breaker: equal priorities go in arrival order
+            priority = comment_priority(data, self.comment_limit)
+            self._queue.put_nowait((-priority, self._queued, subreddit, data, future))
+            raw = await future
+            if raw is None:
+                comments = []  # failed or out of budget: shown without comments, not recorded
+                if self.missing_comments is not None:
+                    self.missing_comments.add(data['id'])
+        return PostJob(subreddit=subreddit, data=data, comments=comments, raw_comments=raw,
+                       limit=self.comment_limit, reply_limit=self.reply_limit)
 
-    for subreddit, post_limit in SUBREDDITS.items():
+    async def _fetch_listing(self, subreddit, post_limit):
+        if self.checkpoint is not None:
+            posts = self.checkpoint.listing(subreddit)
+            if posts is not None:
+                return posts
+        if not self.budget.take():
+            print(f"Skipping r/{subreddit}: fetches stopped by the {self.budget.reason}")
+            return []
         try:
-            posts = get_top_posts(token, subreddit=subreddit, limit=post_limit)
-        except requests.exceptions.RequestException as e:
+            posts = await self._call_with_retries(f"r/{subreddit} listing", get_top_posts, self.client,
+                                                  subreddit=subreddit,
+                                                  limit=listing_limit(post_limit, self.skip))
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"Error fetching posts from r/{subreddit}: {e}")
+            return []
+        posts = drop_shown(posts, post_limit, self.skip)
+        if self.checkpoint is not None:
+            self.checkpoint.save_listing(subreddit, posts)
+        return posts
+
+    async def _fetch_subreddit(self, subreddit, post_limit):
+        try:
+            posts = await self._fetch_listing(subreddit, post_limit)
+        finally:
+            self._listings_left -= 1
+            if self._listings_left == 0:
+                self._listed.set()
+
+        # gather() keeps the listing order, so the result matches the serial path
+        jobs = await asyncio.gather(*[
+            self._post_job(subreddit, p['data'])
+            for p in posts
+        ])
+        parsed = normalize_posts(jobs)
+        record_comments(self.state, jobs, parsed)
+        return parsed
+
+    async def fetch_all(self, subreddits):
+        self._global_limit = asyncio.Semaphore(self.concurrency)
+        self._host_limits = {}
+        self._queue = asyncio.PriorityQueue()
+        self._listed = asyncio.Event()
+        self._listings_left = len(subreddits)
+        if not self.budget.limited or not subreddits:
+            self._listed.set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            self._executor = executor
+            workers = [asyncio.ensure_future(self._comment_worker()) for _ in range(self.concurrency)]
+            try:
+                results = await asyncio.gather(*[
+                    self._fetch_subreddit(subreddit, post_limit)
+                    for subreddit, post_limit in subreddits.items()
+                ])
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        self._executor = None
+        return [post for posts in results for post in posts]
+
+# End-of-run summary lines of the client, its cache, the feed state, the
+# media stage and the archive, with the mode's own `extra` lines before
+# the archive's
+def run_summary(client, state, media, archive, extra=()):
+    summary = [client.stats.summary()]
+    if client.cache is not None:
+        summary.append(client.cache.stats.summary())
+    if state is not None:
+        summary.append(state.summary())
+    summary.append(media.stats.summary())
+    summary.extend(extra)
+    if archive is not None:
+        summary.append(archive.summary())
+    return summary
+
+# Print the run summary, and add it to the job summary when running in GitHub Actions
+def write_run_summary(lines):
+    for line in lines:
+        print(line)
+    summary_path = os.environ.get('GITHUB_STEP_SUMMARY')
+    if summary_path:
+        with open(summary_path, "a", encoding="utf-8") as f:
+            f.write("### Reddit feed run\n\n")
+            f.write("".join(f"- {line}\n" for line in lines))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the daily Reddit feed.")
+    parser.add_argument('--serial', action='store_true',
+                        help="fetch one request at a time (old behaviour, for debugging)")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY,
+                        help="maximum number of requests in flight across all hosts")
+    parser.add_argument('--per-host', type=int, default=MAX_PER_HOST,
+                        help="maximum number of requests in flight per host; every fetch goes to "
+                             "the one API host, so the lower of this and --concurrency applies")
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE,
+                        help="number of keep-alive connections kept per host")
+    parser.add_argument('--max-retries', type=int, default=MAX_RETRIES,
+                        help="retries for throttled (429) or failed (5xx) requests")
+    parser.add_argument('--budget', type=int, default=FETCH_BUDGET,
+                        help="most listing and comment fetches per run (0: no limit)")
+    parser.add_argument('--deadline', type=float, default=FETCH_DEADLINE,
+                        help="seconds after start when no new fetches begin (0: no deadline)")
+    parser.add_argument('--retry-budget', type=int, default=RETRY_BUDGET,
+                        help="retries of failed token, listing and comment fetches per run")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="start afresh instead of resuming the checkpoint of an unfinished run")
+    parser.add_argument('--watch', '--serve', action='store_true',
+                        help="keep running and refresh each subreddit on its own schedule "
+                             "instead of building once")
+    parser.add_argument('--interval', type=int, default=WATCH_INTERVAL,
+                        help="seconds between refreshes of a subreddit in --watch mode; "
+                             "quiet subreddits back off up to WATCH_MAX_INTERVAL")
+    parser.add_argument('--no-stream', action='store_true', default=not STREAM_COMMENTS,
+                        help="download and parse whole comment trees instead of streaming them")
+    parser.add_argument('--cache-dir', default=CACHE_DIR,
+                        help="directory for the HTTP response cache")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="always fetch from Reddit, ignoring the response cache")
+    parser.add_argument('--config', metavar='PATH',
+                        help="JSON file defining several feeds to build from one fetch "
+                             "(default: SUBREDDITS into docs/index.html)")
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE,
+                        help="posts per page, with comments loaded on demand (0: one page, comments inline)")
+    parser.add_argument('--media-preflight', action='store_true',
+                        help="ask the image hosts for file sizes to report the bytes previews save")
+    parser.add_argument('--thumbnails', action='store_true',
+                        help="download and downscale image previews into --media-dir")
+    parser.add_argument('--media-dir', default=MEDIA_DIR,
+                        help="directory for local thumbnails")
+    parser.add_argument('--no-archive', action='store_true',
+                        help="don't record posts in the archive (disables --skip-shown and --digest)")
+    parser.add_argument('--skip-shown', type=int, default=SKIP_SHOWN_DAYS, metavar='DAYS',
+                        help="leave out posts already shown on any of the last DAYS days")
+    parser.add_argument('--digest', action='store_true',
+                        help=f"also write the week's top archived posts to {DIGEST_PATH}")
+    parser.add_argument('--trace', metavar='PATH',
+                        help="write per-stage spans and request metrics to PATH as JSON")
+    parser.add_argument('--full', action='store_true',
+                        help="refetch every comment tree instead of reusing unchanged ones")
+    return parser.parse_args(argv)
+
+# Client with the rate limiter, response cache and token provider set up from `args`
+def make_client(args, tracer=None):
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(os.path.join(args.cache_dir, 'http'), HTTP_CACHE_TTLS,
+                              max_bytes=HTTP_CACHE_MAX_BYTES)
+    client = RedditClient(USER_AGENT, pool_size=args.pool_size, rate_limiter=RateLimiter(),
+                          max_retries=args.max_retries, cache=cache, tracer=tracer, timeout=HTTP_TIMEOUT)
+    client.token_provider = TokenProvider(
+        functools.partial(get_token, client),
+        path=os.path.join(args.cache_dir, 'token.json'),
+        account=f"{CLIENT_ID}:{USERNAME}",
+        refresh_margin=TOKEN_REFRESH_MARGIN,
+    )
+    return client
+
+def fetch_posts(args, client, state, subreddits, comment_limit, reply_limit, skip, budget, retries,
+                checkpoint=None, missing_comments=None):
+    if args.serial:
+        return fetch_posts_serial(client, stream=not args.no_stream, state=state, subreddits=subreddits,
+                                  comment_limit=comment_limit, reply_limit=reply_limit, skip=skip,
+                                  budget=budget, retries=retries, checkpoint=checkpoint,
+                                  missing_comments=missing_comments)
+    engine = FetchEngine(client, concurrency=args.concurrency, per_host=args.per_host,
+                         stream=not args.no_stream, state=state,
+                         comment_limit=comment_limit, reply_limit=reply_limit,
+                         skip=skip, budget=budget, retries=retries, checkpoint=checkpoint,
+                         missing_comments=missing_comments)
+    return asyncio.run(engine.fetch_all(subreddits))
+
+# Whether `posts` differ from what was last written to `path`, remembering
+# them in `rendered` (path -> fingerprint) when they do. Without `rendered`
+# every page counts as changed. Only the posts count: the render date is
+# filled in when a page is actually rewritten.
+def content_changed(rendered, path, posts):
+    if rendered is None:
+        return True
+    fingerprint = hashlib.sha256(repr(posts).encode('utf-8')).hexdigest()
+    if rendered.get(path) == fingerprint:
+        return False
+    rendered[path] = fingerprint
+    return True
+
+# Render every feed from the run's posts; returns the ids of the posts shown
+def render_feeds(feeds, combined_posts, media_dir, cache_dir, tracer=None, rendered=None):
+    posts_by_subreddit = group_by_subreddit(combined_posts)
+    shown = set()
+    for feed in feeds:
+        feed_posts = select_posts(feed, posts_by_subreddit)
+        shown.update(post.post_id for post in feed_posts)
+        if not content_changed(rendered, feed.output, feed_posts):
             continue
 
-        for p in posts:
-            data = p['data']
-            post_id = data['id']
-            title = data['title']
-            author = data['author']
-            ups = data.get('ups', 0)
-            num_comments = data.get('num_comments', 0)
-            url = f"https://www.reddit.com{data['permalink']}"
-            # Truncate selftext if too long
-            selftext = data['selftext'][:500] + '...' if len(data['selftext']) > 500 else data['selftext']
-            
-            # Convert post creation time to human-readable
-            created_utc = data.get('created_utc', None)
-            if created_utc:
-                post_date_str = datetime.datetime.utcfromtimestamp(created_utc).strftime("%Y-%m-%d %H:%M")
-            else:
-                post_date_str = "N/A"
-
-            # Handle media content
-            media_type = None
-            media_url = None
-            dash_url = None
-            hls_url = None
-            
-            # Handle images
-            if data.get('post_hint') == 'image':
-                media_type = 'image'
-                media_url = data['url']
-            # Handle videos
-            elif data.get('is_video'):
-                media_type = 'video'
-                reddit_video = data.get('media', {}).get('reddit_video', {})
-                dash_url = reddit_video.get('dash_url')
-                hls_url = reddit_video.get('hls_url')
-                # fallback_url is usually video-only, no audio
-                fallback_url = reddit_video.get('fallback_url')
-                # If no DASH or HLS, fallback to fallback_url
-                media_url = dash_url or hls_url or fallback_url
-
-            comments = get_top_comments(token, subreddit, post_id)
-            
-            combined_posts.append({
-                'subreddit': subreddit,
-                'post_id': post_id,
-                'title': title,
-                'author': author,
-                'url': url,
-                'selftext': selftext,
-                'comments': comments,
-                'media_type': media_type,
-                'media_url': media_url,
-                'dash_url': dash_url,
-                'hls_url': hls_url,
-                'ups': ups,
-                'num_comments': num_comments,
-                'post_date': post_date_str,
-            })
-
-    # Shuffle all posts randomly (in-place)
-    random.shuffle(combined_posts)
-
-    # Generate HTML from the combined posts
-    html = generate_html(combined_posts)
-
-    # Ensure the 'docs' directory exists and write the index.html
-    os.makedirs("docs", exist_ok=True)
-    with open("docs/index.html", "w", encoding="utf-8") as f:
-        f.write(html)
-
-    print("HTML file generated successfully at 'docs/index.html'.")
+        # Shuffle the feed's posts randomly (in-place)
+        random.shuffle(feed_posts)
+
+        # Render the feed straight into its output file(s)
+        media_href = os.path.relpath(media_dir, os.path.dirname(feed.output) or '.').replace(os.sep, '/')
+        if feed.page_size > 0:
+            count = write_paged(feed_posts, feed.output, feed.page_size, template_name=feed.template,
+                                cache_dir=cache_dir, tracer=tracer, media_href=media_href)
+            print(f"HTML file generated successfully at '{feed.output}' ({count} pages).")
+        else:
+            write_html(feed_posts, feed.output, template_name=feed.template,
+                       cache_dir=cache_dir, tracer=tracer, media_href=media_href)
+            print(f"HTML file generated successfully at '{feed.output}'.")
+    return shown
+
+# Render the feeds from `posts`, then with an archive mark what they show and
+# rebuild the digest. A run that collected nothing (no token, every fetch
+# failed) would only replace good pages with empty ones, so it writes nothing.
+def publish(args, feeds, subreddits, posts, archive, tracer=None, rendered=None):
+    if not posts:
+        print("No posts were collected; leaving the existing pages untouched.")
+        return
+    shown = render_feeds(feeds, posts, args.media_dir, args.cache_dir, tracer, rendered)
+    if archive is None:
+        return
+    archive.mark_shown(shown)
+    if args.digest:
+        # Weekly digest: the best-scoring archived posts, highest first
+        digest_posts = archive.top_posts(DIGEST_DAYS, DIGEST_LIMIT, subreddits=list(subreddits))
+        if content_changed(rendered, DIGEST_PATH, digest_posts):
+            media_href = os.path.relpath(args.media_dir, os.path.dirname(DIGEST_PATH) or '.').replace(os.sep, '/')
+            write_html(digest_posts, DIGEST_PATH, cache_dir=args.cache_dir, tracer=tracer,
+                       media_href=media_href, page_title="Weekly Reddit Digest",
+                       heading="Top Reddit Posts This Week")
+            print(f"Weekly digest generated at '{DIGEST_PATH}' ({len(digest_posts)} posts).")
+
+# Carry local thumbnails over from the previous copies of refreshed posts, so
+# the media stage only handles new images
+def keep_media(posts, previous):
+    thumbnails = {p.post_id: p for p in previous if p.thumbnail}
+    for post in posts:
+        old = thumbnails.get(post.post_id)
+        if old is not None and old.media_url == post.media_url:
+            post.thumbnail = old.thumbnail
+            post.preview_width, post.preview_height = old.preview_width, old.preview_height
+
+# Long-running mode (--watch): the client (token, connection pool), feed
+# state, archive and the latest posts of every subreddit stay in memory, and
+# each subreddit is refetched when the RefreshSchedule says so. Subreddits
+# whose refresh fails keep their previous posts. A page is only rewritten when
+# what it shows changed. Runs until interrupted.
+def watch(args, feeds, subreddits, comment_limit, reply_limit, client, state, archive, skip, media):
+    schedule = RefreshSchedule(subreddits, interval=args.interval, max_interval=WATCH_MAX_INTERVAL)
+    tracer = client.tracer
+    posts_by_subreddit = {}
+    rendered = {}
+    try:
+        while True:
+            due = schedule.due()
+            if due:
+                tracer.reset()  # each refresh reports (and traces) only itself
+                budget = FetchBudget(max_requests=args.budget, deadline=args.deadline)
+                retries = RetryBudget(args.retry_budget)
+                missing_comments = set()
+                with tracer.span('fetch'):
+                    posts = fetch_posts(args, client, state, {sub: subreddits[sub] for sub in due},
+                                        comment_limit, reply_limit, skip, budget, retries,
+                                        missing_comments=missing_comments)
+                if state is not None:
+                    state.save()
+                fetched = group_by_subreddit(posts)
+                for sub in due:
+                    if sub not in fetched:
+                        schedule.done(sub, changed=True)  # try again after the base interval
+                        continue
+                    previous = posts_by_subreddit.get(sub, [])
+                    keep_media(fetched[sub], previous)
+                    schedule.done(sub, changed=[p.post_id for p in fetched[sub]] != [p.post_id for p in previous])
+                    posts_by_subreddit[sub] = fetched[sub]
+                current = [post for sub in subreddits for post in posts_by_subreddit.get(sub, [])]
+                with tracer.span('media'):
+                    media.run([post for post in posts if post.thumbnail is None], keep=current)
+                if archive is not None:
+                    archive.store(posts, keep_comments=missing_comments)
+                publish(args, feeds, subreddits, current, archive, tracer, rendered)
+                if archive is not None:
+                    archive.prune(ARCHIVE_MAX_AGE)
+
+                print(f"Refreshed {len(due)} subreddits, {len(posts)} posts fetched.")
+                for line in [budget.summary()] + retries.summary() + tracer.summary():
+                    print(line)
+                if args.trace:
+                    tracer.write(args.trace)
+            wait = schedule.wait()
+            print(f"Next refresh in {wait:.0f}s.")
+            time.sleep(wait)
+    except KeyboardInterrupt:
+        print("Watch stopped.")
+    finally:
+        client.close()
+        media.close()
+
+    summary = run_summary(client, state, media, archive, [schedule.summary()])
+    if archive is not None:
+        archive.close()
+    write_run_summary(summary)
+
+def main(argv=None):
+    args = parse_args(argv)
+    budget = FetchBudget(max_requests=args.budget, deadline=args.deadline)
+    if args.config:
+        try:
+            feeds = load_feeds(args.config, COMMENT_LIMIT, REPLY_LIMIT, page_size=args.page_size)
+        except (OSError, ValueError) as e:
+            print(f"Error reading feeds config: {e}")
+            return
+    else:
+        feeds = [Feed(name='default', output=OUTPUT_PATH, subreddits=dict(SUBREDDITS),
+                      comment_limit=COMMENT_LIMIT, reply_limit=REPLY_LIMIT, template='index.html',
+                      page_size=args.page_size)]
+    # Union of what every feed needs, so each listing and comment tree is fetched once
+    subreddits, comment_limit, reply_limit = fetch_plan(feeds)
+
+    tracer = Tracer()
+    client = make_client(args, tracer)
+
+    state = None
+    if not args.full:
+        state = FeedState(os.path.join(args.cache_dir, 'feed_state.json'),
+                          threshold=COMMENT_REFRESH_THRESHOLD, max_age=COMMENT_MAX_AGE)
+
+    retries = RetryBudget(args.retry_budget)
+    try:
+        call_with_retries(retries, None, 'token', client.token_provider.token)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        # Without a token nothing can be fetched, but a checkpoint may still
+        # hold enough for a page
+        print(f"Error obtaining token: {e}")
+        budget.stop('token failure')
+
+    archive = None
+    skip = None
+    if not args.no_archive:
+        archive = Archive(os.path.join(args.cache_dir, 'archive.sqlite3'))
+        if args.skip_shown > 0:
+            skip = functools.partial(archive.shown_before, days=args.skip_shown)
+
+    # Media stage: previews were picked while parsing; optionally measure them
+    # and store local thumbnails
+    media = MediaStage(USER_AGENT, args.media_dir, MEDIA_WIDTH, workers=MEDIA_WORKERS,
+                       preflight=args.media_preflight, thumbnails=args.thumbnails)
+
+    if args.watch:
+        watch(args, feeds, subreddits, comment_limit, reply_limit, client, state, archive, skip, media)
+        return
+
+    # Journal of this run's fetches; an unfinished run with the same plan is resumed
+    plan = {'subreddits': subreddits, 'comment_limit': comment_limit, 'reply_limit': reply_limit,
+            'skip_shown': 0 if args.no_archive else args.skip_shown}
+    checkpoint = Checkpoint(os.path.join(args.cache_dir, 'checkpoint.jsonl'), plan,
+                            max_age=CHECKPOINT_MAX_AGE, resume=not args.no_resume)
+    # Posts shown without comments because their fetch failed or was cut
+    missing_comments = set()
+    with tracer.span('fetch'):
+        combined_posts = fetch_posts(args, client, state, subreddits, comment_limit, reply_limit, skip,
+                                     budget, retries, checkpoint, missing_comments)
+    client.close()
+    # Units that failed for good don't keep the journal around; a later run
+    # could not fetch them either
+    checkpoint.close(complete=not retries.unfinished and not budget.cut)
+    if state is not None:
+        state.save()
+
+    with tracer.span('media'):
+        media.run(combined_posts)
+    media.close()
+
+    if archive is not None:
+        archive.store(combined_posts, keep_comments=missing_comments)
+    publish(args, feeds, subreddits, combined_posts, archive, tracer)
+    if archive is not None:
+        archive.prune(ARCHIVE_MAX_AGE)
+
+    summary = run_summary(client, state, media, archive,
+                          [budget.summary()] + retries.summary() + [checkpoint.summary()])
+    if archive is not None:
+        archive.close()
+    summary.extend(tracer.summary())
+    write_run_summary(summary)
+    if args.trace:
+        tracer.write(args.trace)
+        print(f"Trace written to '{args.trace}'.")
 
 if __name__ == "__main__":
     main()
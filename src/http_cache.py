@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import requests
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Response headers kept alongside a cached body
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+# Canonical cache key: the URL with `params` merged in and the query sorted.
+# A `variant` keys a document derived from the response (such as a trimmed
+# one) apart from the response itself.
+def cache_key(url, params=None, variant=None):
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query += [(k, str(v)) for k, v in params.items()]
+    canonical = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ''))
+    if variant is not None:
+        canonical += f'#{variant}'
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+# Rebuild a requests.Response from a cache entry
+def cached_response(url, entry, body):
+    res = requests.Response()
+    res.status_code = 200
+    res.url = url
+    res.headers.update(entry['headers'])
+    res.encoding = 'utf-8'
+    res._content = body
+    return res
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+
+    def add(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def as_dict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'evicted': self.evicted,
+        }
+
+    def summary(self):
+        return (f"HTTP cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.revalidated} revalidated, {self.evicted} evicted")
+
+# Persistent GET response cache. Each entry is a `<key>.json` metadata file
+# plus a `<key>.body` file; the body's mtime doubles as the last-used time for
+# LRU eviction once the directory grows past `max_bytes`. `ttls` is a list of
+# (regex, seconds) pairs matched against the URL path; URLs that match none are
+# not cached.
+class ResponseCache:
+    def __init__(self, directory, ttls, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # key -> [last used, body size], scanned once so eviction never lists the directory
+        self._index = {}
+        for name in os.listdir(directory):
+            if name.endswith('.body'):
+                try:
+                    st = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                self._index[name[:-len('.body')]] = [st.st_mtime, st.st_size]
+        self._total = sum(size for _, size in self._index.values())
+        self.evict()
+
+    def ttl_for(self, url):
+        path = urlsplit(url).path
+        for pattern, ttl in self.ttls:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.json', base + '.body'
+
+    # Returns (entry, body) or (None, None)
+    def load(self, key):
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                entry = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return entry, body
+
+    def is_fresh(self, entry, ttl):
+        return time.time() - entry['stored_at'] < ttl
+
+    # Conditional request headers for revalidating a stale entry
+    def validators(self, entry):
+        headers = {}
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def touch(self, key):
+        now = time.time()
+        with self._lock:
+            if key in self._index:
+                self._index[key][0] = now
+        try:
+            os.utime(self._paths(key)[1], (now, now))
+        except OSError:
+            pass
+
+    # Mark a revalidated (304) entry as fresh again
+    def refresh(self, key, entry):
+        entry['stored_at'] = time.time()
+        self._write(key, entry, None)
+
+    def store(self, key, res):
+        self.store_body(key, res.url, res.headers, res.content)
+
+    def store_body(self, key, url, headers, body):
+        entry = {
+            'url': url,
+            'stored_at': time.time(),
+            'headers': {h: headers[h] for h in STORED_HEADERS if h in headers},
+        }
+        self._write(key, entry, body)
+        with self._lock:
+            _, old_size = self._index.get(key, (0, 0))
+            self._index[key] = [time.time(), len(body)]
+            self._total += len(body) - old_size
+        self.evict()
+
+    def _write(self, key, entry, body):
+        meta_path, body_path = self._paths(key)
+        # Write to temp files and rename so concurrent readers never see half an entry
+        suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        if body is not None:
+            with open(body_path + suffix, 'wb') as f:
+                f.write(body)
+            os.replace(body_path + suffix, body_path)
+        with open(meta_path + suffix, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(meta_path + suffix, meta_path)
+
+    # Drop least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return
+            for key, (_, size) in sorted(self._index.items(), key=lambda item: item[1][0]):
+                if self._total <= self.max_bytes:
+                    break
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                del self._index[key]
+                self._total -= size
+                self.stats.add('evicted')
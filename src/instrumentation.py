@@ -0,0 +1,187 @@
+import re
+import json
+import time
+import threading
+import contextlib
+from urllib.parse import urlsplit
+
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Request URL -> endpoint name used to group latencies
+_ENDPOINTS = [
+    (re.compile(r'/access_token$'), 'token'),
+    (re.compile(r'^/r/[^/]+/top$'), 'listing'),
+    (re.compile(r'^/r/[^/]+/comments/'), 'comments'),
+]
+
+def endpoint_name(url):
+    path = urlsplit(url).path
+    for pattern, name in _ENDPOINTS:
+        if pattern.search(path):
+            return name
+    return path
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class _EndpointMetrics:
+    def __init__(self):
+        self.latencies_ms = []
+        self.statuses = {}
+        self.bytes_received = 0
+        self.retries = 0
+
+    def as_dict(self):
+        latencies = sorted(self.latencies_ms)
+        histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for value in latencies:
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[-1] += 1
+        return {
+            'requests': len(latencies),
+            'statuses': {str(k): v for k, v in sorted(self.statuses.items())},
+            'bytes_received': self.bytes_received,
+            'retries': self.retries,
+            'latency_ms': {
+                'p50': _percentile(latencies, 0.50),
+                'p95': _percentile(latencies, 0.95),
+                'max': latencies[-1] if latencies else 0.0,
+                'buckets': LATENCY_BUCKETS_MS,
+                'histogram': histogram,  # counts per bucket, the last one is overflow
+            },
+        }
+
+# Collects per-stage spans and per-endpoint request metrics for one run.
+# Spans are (name, start, duration, thread, attributes); stages are totals of
+# span durations by name. Everything is thread-safe since fetches run on a
+# thread pool.
+class Tracer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.stages = {}
+        self.endpoints = {}
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, **attrs)
+
+    # Start over, e.g. for the next refresh of a long-running watch
+    def reset(self):
+        with self._lock:
+            self._origin = time.perf_counter()
+            self.started_at = time.time()
+            self.spans = []
+            self.stages = {}
+            self.endpoints = {}
+
+    def add_span(self, name, start, duration, **attrs):
+        with self._lock:
+            self.spans.append((name, start - self._origin, duration, threading.get_ident(), attrs))
+            self.stages[name] = self.stages.get(name, 0.0) + duration
+
+    def _endpoint(self, url):
+        name = endpoint_name(url)
+        if name not in self.endpoints:
+            self.endpoints[name] = _EndpointMetrics()
+        return self.endpoints[name]
+
+    def request(self, url, status, seconds):
+        with self._lock:
+            metrics = self._endpoint(url)
+            metrics.latencies_ms.append(seconds * 1000)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def received(self, url, wire_bytes):
+        with self._lock:
+            self._endpoint(url).bytes_received += wire_bytes
+
+    def retry(self, url):
+        with self._lock:
+            self._endpoint(url).retries += 1
+
+    # Subreddits ordered by time spent fetching their listing and comments
+    def slowest_subreddits(self, count=5):
+        totals = {}
+        with self._lock:
+            for name, _, duration, _, attrs in self.spans:
+                if 'subreddit' in attrs and name in ('listing', 'comments'):
+                    totals[attrs['subreddit']] = totals.get(attrs['subreddit'], 0.0) + duration
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    # Chrome trace-event JSON (opens in chrome://tracing or ui.perfetto.dev)
+    # plus the aggregated metrics
+    def as_dict(self):
+        with self._lock:
+            events = [{
+                'name': name,
+                'cat': 'stage',
+                'ph': 'X',
+                'ts': round(start * 1e6),
+                'dur': round(duration * 1e6),
+                'pid': 1,
+                'tid': tid,
+                'args': attrs,
+            } for name, start, duration, tid, attrs in self.spans]
+            stages = dict(self.stages)
+            endpoints = {name: m.as_dict() for name, m in self.endpoints.items()}
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'metadata': {
+                'started_at': self.started_at,
+                'stages_s': stages,
+                'endpoints': endpoints,
+                'slowest_subreddits': self.slowest_subreddits(),
+            },
+        }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f)
+
+    def summary(self):
+        lines = []
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: item[1], reverse=True)
+            endpoints = {name: m.as_dict() for name, m in sorted(self.endpoints.items())}
+        if stages:
+            lines.append("Stages: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stages))
+        for name, m in endpoints.items():
+            latency = m['latency_ms']
+            lines.append(f"{name}: {m['requests']} requests, p50 {latency['p50']:.0f}ms, "
+                         f"p95 {latency['p95']:.0f}ms, max {latency['max']:.0f}ms, "
+                         f"{m['bytes_received']} bytes, {m['retries']} retries")
+        slowest = self.slowest_subreddits()
+        if slowest:
+            lines.append("Slowest subreddits: " + ", ".join(f"r/{sub} {seconds:.2f}s" for sub, seconds in slowest))
+        return lines
+
+# File wrapper that measures the time spent in write()
+class TimedWriter:
+    def __init__(self, f):
+        self._f = f
+        self.seconds = 0.0
+
+    def write(self, data):
+        start = time.perf_counter()
+        result = self._f.write(data)
+        self.seconds += time.perf_counter() - start
+        return result
@@ -0,0 +1,125 @@
+import re
+import json
+import codecs
+
+# Incremental reader for one array inside a JSON document. Only the
+# containers on the way to the array are walked; everything else is skipped
+# value by value, and each array item is decoded as soon as its bytes have
+# arrived, so a caller that stops early never reads or parses the rest.
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+class _Reader:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    # Append the next chunk, dropping the already consumed prefix
+    def _fill(self):
+        if self.eof:
+            return False
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.buf += self._utf8.decode(b'', final=True)
+            self.eof = True
+            return False
+        self.buf += self._utf8.decode(chunk)
+        return True
+
+    # Next significant character, without consuming it
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of JSON document")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} at offset {self.pos}, got {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    # Decode one complete value, reading more chunks until it is whole
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number that ends the buffer may continue in the next chunk
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    # Move into the value of `key` in the object at the cursor
+    def enter_key(self, key):
+        self.expect('{')
+        if self.peek() == '}':
+            return False
+        while True:
+            name = self.value()
+            self.expect(':')
+            if name == key:
+                return True
+            self.value()
+            if self.peek() == '}':
+                return False
+            self.expect(',')
+
+    # Move onto item `index` of the array at the cursor
+    def enter_index(self, index):
+        self.expect('[')
+        for _ in range(index):
+            if self.peek() == ']':
+                return False
+            self.value()
+            if self.peek() == ']':
+                return False
+            self.expect(',')
+        return self.peek() != ']'
+
+# Yield the items of the array found at `path` (keys for objects, indexes
+# for arrays), e.g. (1, 'data', 'children') for a comments response. Yields
+# nothing when the document does not have that shape.
+def iter_json_items(chunks, path):
+    reader = _Reader(chunks)
+    for step in path:
+        container = '[' if isinstance(step, int) else '{'
+        if reader.peek() != container:
+            return
+        found = reader.enter_index(step) if container == '[' else reader.enter_key(step)
+        if not found:
+            return
+
+    if reader.peek() != '[':
+        return
+    reader.expect('[')
+    if reader.peek() == ']':
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == ']':
+            return
+        reader.expect(',')
+
+# Smallest document that has `items` at `path`, for caching a trimmed response
+def build_document(path, items):
+    document = list(items)
+    for step in reversed(path):
+        if isinstance(step, int):
+            document = [None] * step + [document]
+        else:
+            document = {step: document}
+    return document
@@ -0,0 +1,155 @@
+import io
+import os
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# Pillow is optional; without it thumbnails are stored at the preview's size
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_QUALITY = 82  # JPEG quality for downscaled thumbnails
+
+class MediaStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0  # image posts
+        self.previews = 0  # served from a Reddit preview instead of the original
+        self.thumbnails = 0  # served from a local thumbnail
+        self.failed = 0
+        self.original_bytes = 0  # what the original images would have cost
+        self.served_bytes = 0  # what the page loads instead
+        self.measured = 0  # images both sizes are known for
+
+    def add(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def saved(self, original, served):
+        with self._lock:
+            self.measured += 1
+            self.original_bytes += original
+            self.served_bytes += served
+
+    @property
+    def bytes_saved(self):
+        return max(0, self.original_bytes - self.served_bytes)
+
+    def summary(self):
+        line = (f"Media: {self.images} images, {self.previews} previews, "
+                f"{self.thumbnails} local thumbnails, {self.failed} failed")
+        if self.measured:
+            line += (f", {self.bytes_saved} bytes saved on {self.measured} measured "
+                     f"({self.original_bytes} -> {self.served_bytes})")
+        return line
+
+# Runs after the fetch, over image posts whose preview was already picked by
+# parse_post(). With `preflight` it HEADs the original and the preview to
+# measure the bytes saved; with `thumbnails` it downloads each preview,
+# downscales it to `width` and stores it in `directory` under a content-hash
+# name. Both run on a thread pool; a post whose media fails keeps its remote URL.
+class MediaStage:
+    def __init__(self, user_agent, directory, width, workers=8, preflight=False, thumbnails=False,
+                 timeout=30):
+        self.directory = directory
+        self.width = width
+        self.workers = max(1, workers)
+        self.preflight = preflight
+        self.thumbnails = thumbnails
+        self.timeout = timeout
+        self.stats = MediaStats()
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+
+    # Content-Length of `url`, or None when the host won't say
+    def _size(self, url):
+        try:
+            res = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+            res.raise_for_status()
+        except requests.exceptions.RequestException:
+            return None
+        length = res.headers.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+
+    # Downscaled copy of `content`, as (bytes, extension, width, height)
+    def _downscale(self, content, url):
+        ext = os.path.splitext(url.split('?', 1)[0])[1].lower() or '.jpg'
+        if Image is None:
+            return content, ext, None, None
+        with Image.open(io.BytesIO(content)) as image:
+            if image.width <= self.width and ext in ('.jpg', '.jpeg', '.png', '.webp'):
+                return content, ext, image.width, image.height
+            image.thumbnail((self.width, self.width * 4))
+            out = io.BytesIO()
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image.save(out, 'PNG', optimize=True)
+                ext = '.png'
+            else:
+                image.convert('RGB').save(out, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+                ext = '.jpg'
+            return out.getvalue(), ext, image.width, image.height
+
+    def _store(self, post):
+        source = post.preview_url or post.media_url
+        res = self.session.get(source, timeout=self.timeout)
+        res.raise_for_status()
+        content, ext, width, height = self._downscale(res.content, source)
+        name = hashlib.sha256(content).hexdigest()[:20] + ext
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        post.thumbnail = name
+        if width:
+            post.preview_width, post.preview_height = width, height
+        return len(content)
+
+    def _process(self, post):
+        try:
+            original = self._size(post.media_url) if self.preflight or self.thumbnails else None
+            if self.thumbnails:
+                served = self._store(post)
+                self.stats.add('thumbnails')
+            elif post.preview_url:
+                served = self._size(post.preview_url) if self.preflight else None
+                self.stats.add('previews')
+            else:
+                served = original
+            if original is not None and served is not None:
+                self.stats.saved(original, served)
+        except (requests.exceptions.RequestException, OSError, ValueError) as e:
+            print(f"Error processing media for post {post.post_id}: {e}")
+            self.stats.add('failed')
+            if post.preview_url:
+                self.stats.add('previews')
+
+    # Process `posts`; with thumbnails, files not used by `keep` (default
+    # `posts`) are removed afterwards
+    def run(self, posts, keep=None):
+        images = [p for p in posts if p.media_type == 'image' and p.media_url]
+        self.stats.add('images', len(images))
+        if not (self.preflight or self.thumbnails):
+            self.stats.add('previews', sum(1 for p in images if p.preview_url))
+            return self.stats
+        if self.thumbnails:
+            os.makedirs(self.directory, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(self._process, images))
+        if self.thumbnails:
+            self.prune(posts if keep is None else keep)
+        return self.stats
+
+    # Remove thumbnails no current post uses
+    def prune(self, posts):
+        keep = {p.thumbnail for p in posts if p.thumbnail}
+        for name in os.listdir(self.directory):
+            if name not in keep and not name.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, name))
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,182 @@
+import datetime
+from dataclasses import asdict, dataclass
+
+# Slotted records for what the page shows. Timestamps stay as UNIX seconds
+# and are only formatted by the `utcdate` template filter at render time.
+# (__slots__ is spelled out because dataclass(slots=True) needs Python 3.10.)
+
+SELFTEXT_LIMIT = 500  # characters of selftext kept per post
+PREVIEW_WIDTH = 960  # smallest image width worth showing in the 800px column
+
+@dataclass
+class Reply:
+    __slots__ = ('author', 'body', 'ups', 'created_utc')
+    author: str
+    body: str
+    ups: int
+    created_utc: int
+
+@dataclass
+class Comment:
+    __slots__ = ('author', 'body', 'ups', 'created_utc', 'replies')
+    author: str
+    body: str
+    ups: int
+    created_utc: int
+    replies: list
+
+@dataclass
+class Post:
+    __slots__ = ('subreddit', 'post_id', 'title', 'author', 'permalink', 'selftext',
+                 'media_type', 'media_url', 'dash_url', 'hls_url', 'preview_url', 'preview_width',
+                 'preview_height', 'thumbnail', 'ups', 'num_comments', 'created_utc', 'comments')
+    subreddit: str
+    post_id: str
+    title: str
+    author: str
+    permalink: str
+    selftext: str
+    media_type: str
+    media_url: str
+    dash_url: str
+    hls_url: str
+    preview_url: str  # downscaled copy of an image post's media_url, when Reddit has one
+    preview_width: int
+    preview_height: int
+    thumbnail: str  # file name of a local thumbnail in the media directory
+    ups: int
+    num_comments: int
+    created_utc: int
+    comments: list
+
+    @property
+    def url(self):
+        return f"https://www.reddit.com{self.permalink}"
+
+# Plain-dict round trip for comments, used by the on-disk state files
+def comment_to_dict(comment):
+    return asdict(comment)
+
+def comment_from_dict(data):
+    return Comment(
+        author=data['author'],
+        body=data['body'],
+        ups=data['ups'],
+        created_utc=data['created_utc'],
+        replies=[Reply(**r) for r in data['replies']],
+    )
+
+# Template filter: UNIX seconds -> "YYYY-MM-DD HH:MM", or "N/A" when unknown
+def format_utc(created_utc):
+    if not created_utc:
+        return "N/A"
+    return datetime.datetime.utcfromtimestamp(created_utc).strftime("%Y-%m-%d %H:%M")
+
+def _timestamp(data):
+    created_utc = data.get('created_utc')
+    return int(created_utc) if created_utc else 0
+
+# Parse a t1 thing nested under a comment
+def parse_reply(data):
+    return Reply(
+        author=data.get('author'),
+        body=data.get('body', ''),
+        ups=data.get('ups', 0),
+        created_utc=_timestamp(data),
+    )
+
+# Parse a top-level t1 thing, keeping at most `reply_limit` replies
+def parse_comment(data, reply_limit=3):
+    replies = []
+    replies_data = data.get('replies')
+    if isinstance(replies_data, dict):
+        for reply in replies_data['data'].get('children', [])[:reply_limit]:
+            if reply['kind'] == 't1':
+                replies.append(parse_reply(reply['data']))
+    return Comment(
+        author=data.get('author'),
+        body=data.get('body', ''),
+        ups=data.get('ups', 0),
+        created_utc=_timestamp(data),
+        replies=replies,
+    )
+
+# Parse the children of a comment listing into at most `limit` comments
+def parse_comments(children, limit=3, reply_limit=3):
+    comments = []
+    for c in children:
+        if c['kind'] == 't1':  # Skip "more" stubs
+            comments.append(parse_comment(c['data'], reply_limit))
+            if len(comments) == limit:
+                break
+    return comments
+
+# The smallest entry of an image post's preview resolutions that is at least
+# `min_width` wide (the largest one when none is), as (url, width, height);
+# None when Reddit sent no preview
+def pick_preview(data, min_width=PREVIEW_WIDTH):
+    images = (data.get('preview') or {}).get('images') or []
+    if not images:
+        return None
+    image = images[0]
+    candidates = sorted(image.get('resolutions', []), key=lambda r: r['width'])
+    if image.get('source'):
+        candidates.append(image['source'])
+    if not candidates:
+        return None
+    adequate = [c for c in candidates if c['width'] >= min_width]
+    best = adequate[0] if adequate else candidates[-1]
+    return best['url'], best['width'], best['height']
+
+# Comment listing children of a decoded /comments response, which looks
+# like [ {post info}, {comment tree} ]; empty when it has another shape
+def comment_children(comment_data):
+    if (isinstance(comment_data, list) and len(comment_data) > 1
+            and isinstance(comment_data[1], dict)
+            and 'children' in comment_data[1].get('data', {})):
+        return comment_data[1]['data']['children']
+    return []
+
+# Parse a t3 thing from a subreddit listing
+def parse_post(subreddit, data, comments=None, preview_width=PREVIEW_WIDTH):
+    selftext = data.get('selftext', '')
+    if len(selftext) > SELFTEXT_LIMIT:
+        selftext = selftext[:SELFTEXT_LIMIT] + '...'
+
+    media_type = None
+    media_url = None
+    dash_url = None
+    hls_url = None
+    preview = None
+    if data.get('post_hint') == 'image':
+        media_type = 'image'
+        media_url = data['url']
+        preview = pick_preview(data, preview_width)
+    elif data.get('is_video'):
+        media_type = 'video'
+        reddit_video = (data.get('media') or {}).get('reddit_video', {})
+        dash_url = reddit_video.get('dash_url')
+        hls_url = reddit_video.get('hls_url')
+        # fallback_url is usually video-only, no audio
+        media_url = dash_url or hls_url or reddit_video.get('fallback_url')
+
+    return Post(
+        subreddit=subreddit,
+        post_id=data['id'],
+        title=data['title'],
+        author=data['author'],
+        permalink=data['permalink'],
+        selftext=selftext,
+        media_type=media_type,
+        media_url=media_url,
+        dash_url=dash_url,
+        hls_url=hls_url,
+        preview_url=preview[0] if preview else None,
+        preview_width=preview[1] if preview else None,
+        preview_height=preview[2] if preview else None,
+        thumbnail=None,
+        ups=data.get('ups', 0),
+        num_comments=data.get('num_comments', 0),
+        created_utc=_timestamp(data),
+        comments=comments if comments is not None else [],
+    )
@@ -0,0 +1,29 @@
+from dataclasses import dataclass
+from models import parse_comments, parse_post
+
+# One listing entry waiting to become a Post. `comments` is set when they
+# were reused from the feed state; otherwise `raw_comments` holds the
+# decoded top-level comment things the fetch returned.
+@dataclass
+class PostJob:
+    __slots__ = ('subreddit', 'data', 'comments', 'raw_comments', 'limit', 'reply_limit')
+    subreddit: str
+    data: dict
+    comments: list
+    raw_comments: list
+    limit: int
+    reply_limit: int
+
+def normalize_post(job):
+    comments = job.comments
+    if comments is None:
+        comments = parse_comments(job.raw_comments, job.limit, job.reply_limit)
+    return parse_post(job.subreddit, job.data, comments)
+
+# Posts for `jobs`, in job order. This runs inline: comment trees are
+# already decoded in the fetch threads (streamed ones as the body arrives,
+# which is what lets a fetch stop early), so what is left is cheap dict
+# work, and a process pool cost more in pickling posts back and forth than
+# it saved.
+def normalize_posts(jobs):
+    return [normalize_post(job) for job in jobs]
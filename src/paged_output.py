@@ -0,0 +1,89 @@
+import os
+import re
+import json
+from models import format_utc
+
+# Layout of a paged feed next to its first page, e.g. for docs/index.html:
+#
+#   docs/index.html                      page 1
+#   docs/index-2.html, index-3.html ...  the other pages
+#   docs/index-data/feed.json            compact index of every post
+#   docs/index-data/comments/<id>.json   comments, fetched by the page on demand
+#
+# All links are relative, so the pages work from any base URL.
+
+def paginate(posts, page_size):
+    if page_size <= 0:
+        return [posts]
+    return [posts[i:i + page_size] for i in range(0, len(posts), page_size)] or [[]]
+
+def page_paths(output, count):
+    root, ext = os.path.splitext(output)
+    return [output] + [f'{root}-{n}{ext}' for n in range(2, count + 1)]
+
+def data_dir(output):
+    return f'{os.path.splitext(output)[0]}-data'
+
+# Comments in the shape the page script renders, dates already formatted
+def comments_fragment(post):
+    return [{
+        'author': c.author,
+        'body': c.body,
+        'ups': c.ups,
+        'date': format_utc(c.created_utc),
+        'replies': [{
+            'author': r.author,
+            'body': r.body,
+            'ups': r.ups,
+            'date': format_utc(r.created_utc),
+        } for r in c.replies],
+    } for c in post.comments]
+
+def feed_index(pages, hrefs, comments_href, date):
+    posts = []
+    for number, page in enumerate(pages, 1):
+        for post in page:
+            posts.append({
+                'id': post.post_id,
+                'subreddit': post.subreddit,
+                'title': post.title,
+                'author': post.author,
+                'url': post.url,
+                'ups': post.ups,
+                'num_comments': post.num_comments,
+                'created_utc': post.created_utc,
+                'media_type': post.media_type,
+                'page': number,
+                'comments': f'{comments_href}/{post.post_id}.json' if post.comments else None,
+            })
+    return {'updated': date, 'pages': hrefs, 'posts': posts}
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+# One comments file per post that has comments; files for posts that left
+# the feed are removed
+def write_comment_fragments(posts, directory):
+    keep = set()
+    for post in posts:
+        if post.comments:
+            name = f'{post.post_id}.json'
+            write_json(os.path.join(directory, name), comments_fragment(post))
+            keep.add(name)
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.endswith('.json') and name not in keep:
+            os.remove(os.path.join(directory, name))
+
+# Remove pages left over from an earlier, longer build
+def prune_pages(output, count):
+    directory = os.path.dirname(output) or '.'
+    root, ext = os.path.splitext(os.path.basename(output))
+    pattern = re.compile(rf'^{re.escape(root)}-(\d+){re.escape(ext)}$')
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match and int(match.group(1)) > count:
+            os.remove(os.path.join(directory, name))
@@ -0,0 +1,92 @@
+import time
+import random
+import threading
+
+# Statuses worth retrying: throttled or a transient server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Private generator so retries never disturb the global one used to shuffle posts
+_jitter = random.Random()
+
+# Exponential backoff with full jitter, so concurrent workers don't retry in lockstep
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    return _jitter.uniform(0, min(cap, base * (2 ** attempt)))
+
+# Seconds from a Retry-After header, if the server sent a numeric one
+def retry_after(headers):
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+def _header_float(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+# Token bucket shared by every request to the API. It starts with a
+# conservative rate and then follows Reddit's X-Ratelimit-* headers: the
+# bucket is refilled from X-Ratelimit-Remaining, the refill rate spreads the
+# remaining budget over X-Ratelimit-Reset seconds, and when the budget is
+# spent all callers wait for the window to reset.
+class RateLimiter:
+    def __init__(self, rate=1.0, burst=10, reserve=5, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate  # tokens per second
+        self.capacity = burst
+        self.reserve = reserve  # headroom left for requests already in flight
+        self.used = None
+        self.waited = 0.0  # total seconds callers spent throttled
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Block until a request may be sent
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    wait = (1 - self._tokens) / self.rate if self.rate > 0 else 1.0
+                self.waited += wait
+            self._sleep(wait)
+
+    # Adapt the bucket to the rate-limit headers of a response
+    def update(self, headers):
+        remaining = _header_float(headers, 'X-Ratelimit-Remaining')
+        reset = _header_float(headers, 'X-Ratelimit-Reset')
+        used = _header_float(headers, 'X-Ratelimit-Used')
+        if remaining is None or reset is None:
+            return
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if used is not None:
+                self.used = int(used)
+            budget = max(0.0, remaining - self.reserve)
+            if budget < 1:
+                # Window exhausted: nobody sends anything until it resets
+                self._tokens = 0.0
+                self._blocked_until = max(self._blocked_until, now + reset)
+                return
+            self.capacity = budget
+            self._tokens = budget
+            self.rate = budget / max(reset, 1.0)
+
+    # Stop every caller for `delay` seconds, e.g. after a 429
+    def pause(self, delay):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self._clock() + delay)
@@ -0,0 +1,265 @@
+import json
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util import make_headers
+from rate_limit import RETRY_STATUSES, backoff_delay, retry_after
+from http_cache import cache_key, cached_response
+from json_stream import build_document, iter_json_items
+from instrumentation import Tracer
+
+# gzip/deflate always; br (and zstd) only when urllib3 can decode them
+ACCEPT_ENCODING = make_headers(accept_encoding=True)['accept-encoding']
+
+STREAM_CHUNK_SIZE = 16 * 1024  # decoded bytes handed to the JSON parser at a time
+# After a streamed parse stops early, read up to this much of the rest so the
+# connection goes back to the pool; larger remainders close the connection
+STREAM_DRAIN_LIMIT = 256 * 1024
+
+# Thread-safe counters shared by every request made through a client
+class ClientStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.bytes_received = 0  # bytes on the wire (compressed)
+        self.bytes_decoded = 0  # bytes after content decoding
+        self.retries = 0
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def request_done(self, wire_bytes, decoded_bytes):
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += wire_bytes
+            self.bytes_decoded += decoded_bytes
+
+    def add_bytes(self, wire_bytes, decoded_bytes):
+        with self._lock:
+            self.bytes_received += wire_bytes
+            self.bytes_decoded += decoded_bytes
+
+    def retried(self):
+        with self._lock:
+            self.retries += 1
+
+    @property
+    def connections_reused(self):
+        return max(0, self.requests - self.connections_opened)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'connections_opened': self.connections_opened,
+            'connections_reused': self.connections_reused,
+            'bytes_received': self.bytes_received,
+            'bytes_decoded': self.bytes_decoded,
+            'retries': self.retries,
+        }
+
+    def summary(self):
+        return (f"HTTP: {self.requests} requests, {self.connections_opened} connections opened, "
+                f"{self.connections_reused} reused, {self.bytes_received} bytes received "
+                f"({self.bytes_decoded} decoded), {self.retries} retries")
+
+# Adapter whose connection pools report every new TCP/TLS connection
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': self._counting_pool(HTTPConnectionPool),
+            'https': self._counting_pool(HTTPSConnectionPool),
+        }
+
+    def _counting_pool(self, base):
+        stats = self._stats
+
+        class CountingPool(base):
+            def _new_conn(self):
+                stats.connection_opened()
+                return super()._new_conn()
+
+        return CountingPool
+
+# Owns one pooled keep-alive session shared by every call to the Reddit API.
+# Requests wait on the optional rate limiter and 429/5xx responses are
+# retried with jittered exponential backoff. GETs are answered from the
+# optional ResponseCache while fresh and revalidated once stale. Requests
+# without explicit `auth` carry a bearer token from the TokenProvider, and a
+# 401 is retried once with a freshly fetched token. Every attempt is
+# reported to the tracer. Every request gets the (connect, read) `timeout`,
+# so a stalled socket raises instead of holding a worker thread forever;
+# for streamed bodies the read timeout applies to each chunk.
+class RedditClient:
+    def __init__(self, user_agent, pool_size=10, rate_limiter=None, max_retries=5, cache=None,
+                 token_provider=None, tracer=None, timeout=(10, 30)):
+        self.stats = ClientStats()
+        self.timeout = timeout
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.token_provider = token_provider
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': user_agent,
+            'Accept-Encoding': ACCEPT_ENCODING,
+        })
+        adapter = _CountingAdapter(self.stats, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _send(self, method, url, **kwargs):
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.perf_counter()
+        res = self.session.request(method, url, **kwargs)
+        if kwargs.get('stream') and res.status_code == 200:
+            # The caller reads the body; its bytes are counted in _finish_stream()
+            self.stats.request_done(0, 0)
+        else:
+            # Reading .content drains the body so raw.tell() reports the wire size
+            decoded = len(res.content)
+            wire = res.raw.tell() if res.raw is not None else decoded
+            self.stats.request_done(wire, decoded)
+            self.tracer.received(url, wire)
+        self.tracer.request(url, res.status_code, time.perf_counter() - start)
+        if self.rate_limiter:
+            self.rate_limiter.update(res.headers)
+        return res
+
+    def request(self, method, url, **kwargs):
+        attempt = 0
+        reauthorized = False
+        while True:
+            token = None
+            if self.token_provider is not None and 'auth' not in kwargs:
+                token = self.token_provider.token()
+                kwargs['headers'] = {**(kwargs.get('headers') or {}), 'Authorization': f'bearer {token}'}
+            res = self._send(method, url, **kwargs)
+            if res.status_code == 401 and token is not None and not reauthorized:
+                # Token revoked or expired early: get a new one and try once more
+                self.token_provider.invalidate(token)
+                reauthorized = True
+                continue
+            if res.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                return res
+            delay = retry_after(res.headers)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            if res.status_code == 429 and self.rate_limiter:
+                # Throttled: hold back every worker, not just this one
+                self.rate_limiter.pause(delay)
+            self.stats.retried()
+            self.tracer.retry(url)
+            attempt += 1
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        ttl = self.cache.ttl_for(url) if self.cache else None
+        if ttl is None:
+            return self.request('GET', url, **kwargs)
+
+        key = cache_key(url, kwargs.get('params'))
+        entry, body = self.cache.load(key)
+        if entry is not None and self.cache.is_fresh(entry, ttl):
+            self.cache.touch(key)
+            self.cache.stats.add('hits')
+            return cached_response(url, entry, body)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            headers.update(self.cache.validators(entry))
+        res = self.request('GET', url, headers=headers, **kwargs)
+        if res.status_code == 304 and entry is not None:
+            self.cache.refresh(key, entry)
+            self.cache.touch(key)
+            self.cache.stats.add('revalidated')
+            return cached_response(url, entry, body)
+
+        self.cache.stats.add('misses')
+        if res.status_code == 200:
+            self.cache.store(key, res)
+        return res
+
+    # Yield the items of the JSON array at `path` in the response to a GET,
+    # parsing the body as it arrives. When the caller stops early the rest of
+    # the body is never parsed, and the cache keeps only the items that were
+    # consumed. How many that is depends on the caller's `limit` (the items it
+    # wants before it stops), so the trimmed document is cached under a key
+    # of its own for each `limit`, apart from the full response get() caches.
+    def iter_json(self, url, path, params=None, limit=None):
+        ttl = self.cache.ttl_for(url) if self.cache else None
+        key = entry = body = None
+        headers = {}
+        if ttl is not None:
+            key = cache_key(url, params, variant=f'stream:{limit}')
+            entry, body = self.cache.load(key)
+            if entry is not None and self.cache.is_fresh(entry, ttl):
+                self.cache.touch(key)
+                self.cache.stats.add('hits')
+                yield from iter_json_items([body], path)
+                return
+            if entry is not None:
+                headers = self.cache.validators(entry)
+
+        res = self.request('GET', url, params=params, headers=headers, stream=True)
+        if res.status_code == 304 and entry is not None:
+            self.cache.refresh(key, entry)
+            self.cache.touch(key)
+            self.cache.stats.add('revalidated')
+            yield from iter_json_items([body], path)
+            return
+        if key is not None:
+            self.cache.stats.add('misses')
+        res.raise_for_status()
+
+        decoded = [0]
+
+        def counted(chunks):
+            for chunk in chunks:
+                decoded[0] += len(chunk)
+                yield chunk
+
+        chunks = counted(res.iter_content(STREAM_CHUNK_SIZE))
+        items = []
+        complete = False
+        try:
+            for item in iter_json_items(chunks, path):
+                items.append(item)
+                yield item
+            complete = True
+        except GeneratorExit:
+            complete = True
+            raise
+        finally:
+            self._finish_stream(res, chunks, decoded)
+            if complete and key is not None:
+                document = json.dumps(build_document(path, items)).encode('utf-8')
+                self.cache.store_body(key, res.url, res.headers, document)
+
+    def _finish_stream(self, res, chunks, decoded):
+        drained = 0
+        for chunk in chunks:
+            drained += len(chunk)
+            if drained > STREAM_DRAIN_LIMIT:
+                break
+        wire = res.raw.tell() if res.raw is not None else decoded[0]
+        res.close()
+        self.stats.add_bytes(wire, decoded[0])
+        self.tracer.received(res.url, wire)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
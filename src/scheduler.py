@@ -0,0 +1,179 @@
+import math
+import time
+import threading
+import requests
+from rate_limit import RETRY_STATUSES, backoff_delay
+
+# Request budget and deadline for one run. Every listing or comment-tree
+# fetch asks take() first; once the budget is spent or the deadline has
+# passed the answer is no, requests already in flight finish normally, and
+# the page is built from what was collected. 0 means no limit.
+class FetchBudget:
+    def __init__(self, max_requests=0, deadline=0, clock=time.monotonic):
+        self.max_requests = max_requests
+        self.deadline = deadline
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+        self.used = 0  # fetches allowed
+        self.cut = 0  # fetches refused
+        self.empty = 0  # comment fetches skipped because the post has no comments
+        self.reason = None  # why fetches are refused: 'budget', 'deadline' or stop()'s reason
+        self._stopped = False
+
+    def _refusal(self):
+        if self._stopped:
+            return self.reason
+        if self.max_requests and self.used >= self.max_requests:
+            return 'budget'
+        if self.deadline and self._clock() - self._started >= self.deadline:
+            return 'deadline'
+        return None
+
+    def take(self):
+        with self._lock:
+            reason = self._refusal()
+            if reason is None:
+                self.used += 1
+                return True
+            self.reason = self.reason or reason
+            self.cut += 1
+            return False
+
+    # Refuse every fetch from now on, e.g. when no token can be had
+    def stop(self, reason):
+        with self._lock:
+            self.reason = reason
+            self._stopped = True
+
+    # Whether fetches can be refused at all, i.e. which ones run matters
+    @property
+    def limited(self):
+        return bool(self.max_requests or self.deadline)
+
+    def skip_empty(self):
+        with self._lock:
+            self.empty += 1
+
+    def summary(self):
+        limits = []
+        if self.max_requests:
+            limits.append(f"budget {self.max_requests}")
+        if self.deadline:
+            limits.append(f"deadline {self.deadline}s")
+        line = (f"Schedule: {self.used} fetches ({', '.join(limits) or 'no limits'}), "
+                f"{self.empty} empty comment trees skipped")
+        if self.cut:
+            line += f", {self.cut} fetches cut by the {self.reason}"
+        return line
+
+# Whether a failed fetch may succeed when tried again: connection errors,
+# timeouts and 429/5xx responses. Anything else (403 for a private or banned
+# subreddit, 404 for a deleted post, a malformed response) fails the same
+# way every time.
+def retryable(error):
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError))
+
+# Retries for fetch units (the token, a listing, a comment tree) whose
+# request failed even after the client's own 429/5xx retries. One budget is
+# shared by the whole run so a bad network can't stretch it indefinitely.
+# Failed units are recorded for the run summary; `unfinished` counts those
+# that failed for a passing reason, which a later run could still fetch.
+class RetryBudget:
+    def __init__(self, retries=10):
+        self.retries = retries
+        self.used = 0
+        self.failures = []  # (unit, error, permanent)
+        self.unfinished = 0
+        self._lock = threading.Lock()
+
+    # Seconds to wait before retrying `unit` after `error` on its `attempt`-th
+    # failure, or None (and the failure recorded) when it can't be retried.
+    # Permanent errors are never retried. A retry is also a fetch, so it
+    # needs room in the fetch `budget`.
+    def retry_delay(self, unit, error, attempt, budget=None):
+        permanent = not retryable(error)
+        allowed = False
+        if not permanent:
+            with self._lock:
+                allowed = self.used < self.retries
+                if allowed:
+                    self.used += 1
+        if allowed and (budget is None or budget.take()):
+            print(f"Retrying {unit} after {type(error).__name__}: {error}")
+            return backoff_delay(attempt)
+        with self._lock:
+            self.failures.append((unit, f"{type(error).__name__}: {error}", permanent))
+            if not permanent:
+                self.unfinished += 1
+        return None
+
+    def summary(self):
+        lines = [f"Retries: {self.used} of {self.retries} used, {len(self.failures)} units failed"]
+        lines.extend(f"Failed {unit}: {error}" + (" (not retried)" if permanent else "")
+                     for unit, error, permanent in self.failures)
+        return lines
+
+# Call `func` until it succeeds or `retries` gives up on `unit` (then the
+# last error is raised)
+def call_with_retries(retries, budget, unit, func, *args, sleep=time.sleep, **kwargs):
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            attempt += 1
+            delay = retries.retry_delay(unit, e, attempt, budget)
+            if delay is None:
+                raise
+            sleep(delay)
+
+# When each subreddit is next refreshed in watch mode. A subreddit starts at
+# `interval` seconds; each refresh that brings no new posts doubles its
+# interval up to `max_interval`, and one that does resets it, so quiet
+# subreddits are asked less often than busy ones.
+class RefreshSchedule:
+    def __init__(self, subreddits, interval=3600, max_interval=6 * 60 * 60, clock=time.monotonic):
+        self.interval = max(1, interval)
+        self.max_interval = max(self.interval, max_interval)
+        self._clock = clock
+        now = clock()
+        self.intervals = {sub: self.interval for sub in subreddits}
+        self.next_at = {sub: now for sub in subreddits}
+        self.refreshes = 0
+
+    # Subreddits due for a refresh, in plan order
+    def due(self):
+        now = self._clock()
+        return [sub for sub, at in self.next_at.items() if at <= now]
+
+    def done(self, subreddit, changed):
+        if changed:
+            self.intervals[subreddit] = self.interval
+        else:
+            self.intervals[subreddit] = min(self.max_interval, 2 * self.intervals[subreddit])
+        self.next_at[subreddit] = self._clock() + self.intervals[subreddit]
+        self.refreshes += 1
+
+    # Seconds until the next subreddit is due
+    def wait(self):
+        return max(0.0, min(self.next_at.values()) - self._clock())
+
+    def summary(self):
+        intervals = ", ".join(f"r/{sub} {seconds}s" for sub, seconds in self.intervals.items())
+        return f"Refresh: {self.refreshes} subreddit refreshes, current intervals {intervals}"
+
+# How much a listing entry's comments are worth fetching, from the listing
+# data alone; higher goes first. None when they would show nothing.
+# Busy, upvoted threads rank first; stickied and NSFW posts go last.
+def comment_priority(data, limit=3):
+    num_comments = data.get('num_comments') or 0
+    if limit <= 0 or num_comments <= 0:
+        return None
+    score = math.log1p(num_comments) + math.log1p(max(0, data.get('ups') or 0))
+    if data.get('stickied') or data.get('over_18'):
+        score -= 100
+    return score
@@ -0,0 +1,68 @@
+import os
+import json
+import time
+import threading
+
+# Hands out OAuth access tokens, reusing one until shortly before it expires.
+# `fetch()` must return (access_token, expires_in). When `path` is set the
+# token is also kept on disk so later runs within the hour skip the password
+# grant; `account` ties the file to one client/user so a config change never
+# picks up someone else's token.
+class TokenProvider:
+    def __init__(self, fetch, path=None, account='', refresh_margin=300):
+        self._fetch = fetch
+        self.path = path
+        self.account = account
+        self.refresh_margin = refresh_margin  # seconds before expiry to fetch a new token
+        self.fetched = 0  # tokens obtained from Reddit this run
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._load()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get('account') == self.account:
+            self._token = cached.get('access_token')
+            self._expires_at = float(cached.get('expires_at', 0))
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        # The file holds a live credential, so keep it private to this user
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({
+                'account': self.account,
+                'access_token': self._token,
+                'expires_at': self._expires_at,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def _valid(self):
+        return self._token and time.time() < self._expires_at - self.refresh_margin
+
+    def token(self):
+        with self._lock:
+            if not self._valid():
+                token, expires_in = self._fetch()
+                self._token = token
+                self._expires_at = time.time() + float(expires_in)
+                self.fetched += 1
+                self._save()
+            return self._token
+
+    # Drop a token the API rejected, unless another thread already replaced it
+    def invalidate(self, token):
+        with self._lock:
+            if self._token == token:
+                self._token = None
+                self._expires_at = 0.0